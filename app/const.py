@@ -5,3 +5,19 @@ Human: {input}
 AI:"""
 
 MODEL: str = "GigaChat"
+
+# Фразы банка: синтезируются заранее и хранятся на диске
+PHRASES: dict[str, str] = {
+    "greeting": "Здравствуйте! Чем могу помочь?",
+    "one_moment": "Секунду.",
+    "let_me_think": "Сейчас подумаю.",
+    "checking": "Минутку, уточняю.",
+    "apology": "Извините, не получилось ответить. Повторите, пожалуйста.",
+    "ok": "Хорошо.",
+    "nothing_to_repeat": "Я пока ничего не говорил.",
+    "you_are_welcome": "Пожалуйста! Обращайтесь.",
+    "goodbye": "До свидания! Хорошего дня.",
+}
+
+# Фразы-заполнители, пока модель думает над ответом
+FILLERS: tuple[str, ...] = ("one_moment", "let_me_think", "checking")
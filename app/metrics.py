@@ -0,0 +1,65 @@
+import time
+from collections import defaultdict, deque
+
+from loguru import logger
+
+TIMING_WINDOW = 1000  # Сколько последних замеров хранить для перцентилей
+
+
+class Metrics:
+    """Простые счётчики и замеры времени в памяти процесса."""
+
+    def __init__(self):
+        self.counters: dict[str, int] = defaultdict(int)
+        self.timings: dict[str, deque] = defaultdict(
+            lambda: deque(maxlen=TIMING_WINDOW)
+        )
+
+    def incr(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+    def observe(self, name: str, value: float) -> None:
+        self.timings[name].append(value)
+
+    def snapshot(self) -> dict:
+        """Текущие значения счётчиков и p50/p95 по замерам."""
+        timings = {}
+        for name, values in self.timings.items():
+            ordered = sorted(values)
+            timings[name] = {
+                "count": len(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            }
+        return {"counters": dict(self.counters), "timings": timings}
+
+
+metrics = Metrics()
+
+
+class TurnTimer:
+    """
+    Замер этапов одной реплики ассистента.
+
+    Каждая отметка фиксируется один раз — в момент первого наступления этапа —
+    и отсчитывается от начала реплики в миллисекундах.
+    """
+
+    def __init__(self, name: str = "turn"):
+        self.name = name
+        self.started = time.perf_counter()
+        self.marks: dict[str, float] = {}
+
+    def mark(self, stage: str) -> None:
+        if stage not in self.marks:
+            self.marks[stage] = (time.perf_counter() - self.started) * 1000
+
+    def report(self) -> dict[str, float]:
+        """Пишет замеры в лог и в общие метрики."""
+        for stage, value in self.marks.items():
+            metrics.observe(f"{self.name}.{stage}_ms", value)
+        logger.info(
+            f"{self.name} timings: "
+            + ", ".join(f"{stage}={value:.0f}ms" for stage, value in self.marks.items())
+        )
+        return self.marks
@@ -1,26 +1,105 @@
+import asyncio
+import os
+from typing import AsyncIterator
+
 from langchain_core.prompts import PromptTemplate
-from langchain_gigachat.chat_models.gigachat import GigaChat
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
 from loguru import logger
-from app.const import TEMPLATE, MODEL
+from app.const import PHRASES, TEMPLATE
+from app.metrics import metrics
+from app.sber.ai_agent.llm import authorize, get_llm
+from app.sber.ai_agent.memory import BoundedSummaryMemory, count_tokens
+from app.sber.ai_agent.response_cache import RESPONSE_CACHE, response_cache
 
+PROMPT = PromptTemplate(input_variables=["history", "input"], template=TEMPLATE)
 
-@logger.catch
-def initialize_ai_agent(gigachat_token, model=MODEL) -> ConversationChain:
-    llm = GigaChat(access_token=gigachat_token, verify_ssl_certs=False, model=model)
-    conversation = ConversationChain(
-        llm=llm,
-        verbose=True,
-        memory=ConversationBufferMemory(),
-        prompt=PromptTemplate(input_variables=["history", "input"], template=TEMPLATE),
-    )
-    return conversation
+# Сколько секунд ждать первый токен и весь ответ GigaChat
+LLM_FIRST_TOKEN_TIMEOUT = float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "15"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+# Что сказать пользователю, если модель не ответила вовремя
+TIMEOUT_ANSWER = PHRASES["apology"]
 
 
 @logger.catch
-def analyze_text(text: str, conversation) -> str:
-    """Анализ текста с помощью AI-агента."""
-    response = conversation.predict(input=text)
-    logger.success(f"AI analysis result: {response}")
-    return response
+def initialize_ai_agent() -> BoundedSummaryMemory:
+    """Создаёт память разговора для новой сессии; клиент GigaChat общий для всех."""
+    return BoundedSummaryMemory(llm=get_llm())
+
+
+async def stream_answer(
+    text: str, memory: BoundedSummaryMemory, remember: bool = True
+) -> AsyncIterator[str]:
+    """
+    Потоковый ответ AI-агента: отдаёт токены по мере генерации.
+
+    Запрос к GigaChat идёт в отдельной задаче, а здесь токены ждутся с таймаутом:
+    на первый токен — LLM_FIRST_TOKEN_TIMEOUT, на весь ответ — LLM_TIMEOUT.
+    Если модель не уложилась, запрос отменяется; если она не успела сказать
+    ничего, отдаётся TIMEOUT_ANSWER. Закрытие генератора (например, при отмене
+    ответа после отключения клиента) тоже отменяет запрос.
+
+    История разговора обновляется после получения полного ответа; с
+    remember=False ответ в неё не записывается (это делает вызывающий).
+
+    С RESPONSE_CACHE вопрос, заданный без истории разговора, сначала ищется в
+    кэше ответов — при попадании модель не вызывается, а синтез того же текста
+    берётся из кэша TTS. В кэш попадают только полные ответы на такие вопросы.
+    """
+    history = memory.load_memory_variables({})
+    # Кэшированный ответ годится только на вопрос без истории: «а в субботу?»
+    # после разговора о часах работы значит не то же, что в начале
+    cacheable = RESPONSE_CACHE and not history[memory.memory_key]
+    if cacheable and (cached := response_cache.get(text)) is not None:
+        yield cached
+        if remember:
+            memory.save_context({"input": text}, {"response": cached})
+        return
+
+    authorize()
+    prompt = PROMPT.format(input=text, **history)
+    chunks: asyncio.Queue = asyncio.Queue()
+
+    async def generate() -> None:
+        try:
+            async for chunk in get_llm().astream(prompt):
+                chunks.put_nowait(chunk)
+        finally:
+            chunks.put_nowait(None)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + LLM_TIMEOUT
+    first_token_deadline = min(deadline, loop.time() + LLM_FIRST_TOKEN_TIMEOUT)
+    prompt_tokens = count_tokens(prompt)
+    answer = ""
+    complete = False
+    task = asyncio.create_task(generate())
+    try:
+        while True:
+            timeout = (deadline if answer else first_token_deadline) - loop.time()
+            chunk = await asyncio.wait_for(chunks.get(), timeout)
+            if chunk is None:
+                await task  # Ошибку запроса пробрасываем наверх
+                complete = True
+                break
+            if chunk.usage_metadata:
+                prompt_tokens = chunk.usage_metadata["input_tokens"]
+            answer += chunk.content
+            yield chunk.content
+    except TimeoutError:
+        metrics.incr("llm.timeouts")
+        logger.warning(
+            f"GigaChat timed out waiting for {'the answer' if answer else 'first token'}."
+        )
+        if not answer:
+            yield TIMEOUT_ANSWER
+            return
+    finally:
+        task.cancel()
+
+    # Размер промпта по репликам: с ограниченной памятью он не должен расти
+    metrics.observe("llm.prompt_tokens", prompt_tokens)
+    logger.info(f"Prompt tokens: {prompt_tokens}")
+    if remember:
+        memory.save_context({"input": text}, {"response": answer})
+    if cacheable and complete:
+        response_cache.put(text, answer)
+    logger.success(f"AI analysis result: {answer}")
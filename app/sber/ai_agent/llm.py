@@ -0,0 +1,40 @@
+from gigachat.context import authorization_cvar
+from langchain_gigachat.chat_models.gigachat import GigaChat
+from loguru import logger
+
+from app.const import MODEL
+from app.sber.sql.get_tokens_from_db import get_token_from_db
+
+_llm: GigaChat | None = None
+
+
+def get_llm() -> GigaChat:
+    """
+    Общий на процесс клиент GigaChat.
+
+    Внутри у него один пул HTTP-соединений, который переиспользуют все сессии.
+    Токен в клиент не зашивается: перед каждым вызовом его подставляет authorize().
+    """
+    global _llm
+    if _llm is None:
+        _llm = GigaChat(verify_ssl_certs=False, model=MODEL)
+        logger.info("GigaChat client created.")
+    return _llm
+
+
+def authorize() -> None:
+    """
+    Подставляет актуальный токен giga_chat в заголовок запросов текущей задачи.
+
+    Значение живёт в contextvar, поэтому обновлённый фоновой задачей токен
+    подхватывается следующим же вызовом без пересоздания клиента.
+    """
+    authorization_cvar.set(f"Bearer {get_token_from_db('giga_chat').get('token')}")
+
+
+async def close_llm() -> None:
+    """Закрывает соединения общего клиента."""
+    global _llm
+    if _llm is not None:
+        await _llm._client.aclose()
+        _llm = None
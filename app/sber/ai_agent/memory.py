@@ -0,0 +1,103 @@
+import asyncio
+import os
+from typing import Any
+
+from langchain_core.memory import BaseMemory
+from loguru import logger
+from pydantic import Field, PrivateAttr
+
+from app.metrics import metrics
+from app.sber.ai_agent.llm import authorize
+
+# Бюджет истории в промпте (в токенах) — окно последних реплик плюс сводка
+HISTORY_TOKEN_BUDGET = int(os.getenv("LLM_HISTORY_TOKEN_BUDGET", "800"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("LLM_SUMMARY_TOKEN_BUDGET", "200"))
+CHARS_PER_TOKEN = 3  # Грубая оценка для русского текста
+
+SUMMARY_PROMPT = """Кратко перескажи разговор пользователя (Human) и AI, сохранив \
+факты, имена и договорённости. Не больше {words} слов.
+
+Предыдущая сводка:
+{summary}
+
+Новые реплики:
+{turns}
+
+Сводка:"""
+
+
+def count_tokens(text: str) -> int:
+    """Приблизительное число токенов в тексте."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def format_turns(turns: list[tuple[str, str]]) -> str:
+    return "\n".join(f"Human: {human}\nAI: {ai}" for human, ai in turns)
+
+
+class BoundedSummaryMemory(BaseMemory):
+    """
+    Память разговора с ограниченным размером.
+
+    В промпт попадают сводка старых реплик и окно последних реплик, которое
+    укладывается в token_budget. Вытесненные из окна реплики сворачиваются в
+    сводку фоновой задачей — ответ пользователю этого не ждёт.
+    """
+
+    llm: Any = None
+    token_budget: int = HISTORY_TOKEN_BUDGET
+    summary: str = ""
+    turns: list[tuple[str, str]] = Field(default_factory=list)
+    memory_key: str = "history"
+
+    _pending: list[tuple[str, str]] = PrivateAttr(default_factory=list)
+    _summarizing: asyncio.Task | None = PrivateAttr(default=None)
+
+    @property
+    def memory_variables(self) -> list[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: dict[str, Any]) -> dict[str, str]:
+        parts = []
+        if self.summary:
+            parts.append(f"Краткое содержание предыдущего разговора: {self.summary}")
+        if self.turns:
+            parts.append(format_turns(self.turns))
+        return {self.memory_key: "\n".join(parts)}
+
+    def save_context(self, inputs: dict[str, Any], outputs: dict[str, str]) -> None:
+        self.turns.append((inputs["input"], outputs["response"]))
+        self._trim()
+
+    def clear(self) -> None:
+        self.summary = ""
+        self.turns.clear()
+        self._pending.clear()
+
+    def _trim(self) -> None:
+        """Вытесняет старые реплики из окна и запускает их свёртку в сводку."""
+        budget = self.token_budget - count_tokens(self.summary)
+        # Последняя реплика остаётся в окне всегда
+        while len(self.turns) > 1 and count_tokens(format_turns(self.turns)) > budget:
+            self._pending.append(self.turns.pop(0))
+        if self._pending and self.llm is not None:
+            if self._summarizing is None or self._summarizing.done():
+                self._summarizing = asyncio.create_task(self._summarize())
+
+    async def _summarize(self) -> None:
+        while self._pending:
+            turns, self._pending = self._pending, []
+            prompt = SUMMARY_PROMPT.format(
+                words=SUMMARY_TOKEN_BUDGET,
+                summary=self.summary or "(нет)",
+                turns=format_turns(turns),
+            )
+            try:
+                authorize()
+                response = await self.llm.ainvoke(prompt)
+            except Exception as e:
+                logger.error(f"Conversation summary failed: {e}")
+                return
+            self.summary = response.content.strip()
+            metrics.incr("llm.summaries")
+            logger.debug(f"Conversation summary updated: {self.summary}")
@@ -0,0 +1,203 @@
+import math
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+from loguru import logger
+
+from app.metrics import metrics
+
+# Кэш ответов включается явно: ответ из кэша не учитывает свежие данные модели
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "0") == "1"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # Секунды
+# Порог косинусной близости для нечёткого поиска по символьным n-граммам
+# (разумно 0.85–0.95); 0 — только точное совпадение
+RESPONSE_CACHE_FUZZY = float(os.getenv("RESPONSE_CACHE_FUZZY", "0"))
+RESPONSE_CACHE_MIN_CHARS = 8  # Короткие реплики («да», «а завтра?») не кэшируются
+NGRAM = 3
+
+UNITS = (
+    "ноль один два три четыре пять шесть семь восемь девять десять одиннадцать "
+    "двенадцать тринадцать четырнадцать пятнадцать шестнадцать семнадцать "
+    "восемнадцать девятнадцать"
+).split()
+TENS = "двадцать тридцать сорок пятьдесят шестьдесят семьдесят восемьдесят девяносто"
+HUNDREDS = "сто двести триста четыреста пятьсот шестьсот семьсот восемьсот девятьсот"
+NUMBER_WORDS = {
+    **{word: number for number, word in enumerate(UNITS)},
+    **{word: number * 10 for number, word in enumerate(TENS.split(), start=2)},
+    **{word: number * 100 for number, word in enumerate(HUNDREDS.split(), start=1)},
+    "одна": 1,
+    "одно": 1,
+    "две": 2,
+}
+THOUSAND_WORDS = {"тысяча", "тысячи", "тысяч", "тысячу"}
+DIGIT_GROUP = re.compile(r"(?<=\d)[\s ](?=\d{3}\b)")  # 10 000 -> 10000
+DECIMAL = re.compile(r"(?<=\d),(?=\d)")  # 1,5 -> 1.5
+TOKEN = re.compile(r"\d+(?:\.\d+)?|\w+")
+
+
+def place(number: int) -> int:
+    """Старший разряд слова-числа: у 10–19 — десятки, хотя занят и разряд единиц."""
+    if number >= 100:
+        return 100
+    return 10 if number >= 10 else 1
+
+
+def normalize(text: str) -> str:
+    """
+    Ключ кэша: нижний регистр, без пунктуации, числа цифрами.
+
+    «Сколько стоит, двадцать пять?» и «сколько стоит 25» дают один ключ,
+    «две тысячи сто двадцать пять» — 2125. Подряд идущие слова-числа
+    складываются, пока каждое следующее ложится в ещё свободный младший
+    разряд; иначе начинается новое число («два три» — «2 3»).
+    """
+    text = text.lower().replace("ё", "е")
+    text = DECIMAL.sub(".", DIGIT_GROUP.sub("", text))
+    words: list[str] = []
+    thousands = group = 0
+    free = 0  # Старший свободный разряд собираемого числа; 0 — числа нет
+
+    def close() -> None:
+        nonlocal thousands, group, free
+        if free:
+            words.append(str(thousands + group))
+        thousands = group = free = 0
+
+    for word in TOKEN.findall(text):
+        if word in THOUSAND_WORDS:
+            if thousands:
+                close()
+            thousands, group, free = (group or 1) * 1000, 0, 1000
+            continue
+        if word.isdigit():
+            # Число цифрами может получить только множитель: «25 тысяч»
+            close()
+            group, free = int(word), 1
+            continue
+        number = NUMBER_WORDS.get(word)
+        if number is None:
+            close()
+            words.append(word)
+            continue
+        if free and place(number) >= free:
+            close()
+        group += number
+        free = place(number) if number >= 20 else 1
+    close()
+    return " ".join(words)
+
+
+def numbers(key: str) -> list[str]:
+    """Числа ключа по порядку: «25 км» и «250 км» близки по n-граммам, но не равны."""
+    return [word for word in key.split() if word[0].isdigit()]
+
+
+def ngrams(key: str) -> tuple[Counter, float]:
+    """Вектор символьных n-грамм и его длина."""
+    padded = f" {key} "
+    vector = Counter(padded[i : i + NGRAM] for i in range(len(padded) - NGRAM + 1))
+    return vector, math.sqrt(sum(count * count for count in vector.values()))
+
+
+def cosine(a: Counter, a_norm: float, b: Counter, b_norm: float) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(count * b[gram] for gram, count in a.items()) / (a_norm * b_norm)
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    stored_at: float
+    vector: Counter
+    norm: float
+    numbers: list[str]
+
+
+class ResponseCache:
+    """
+    Кэш ответов LLM на повторяющиеся вопросы (часы работы, сброс пароля...).
+
+    Ключ — нормализованный текст вопроса. Записи живут ttl секунд, при
+    переполнении вытесняется самая давно использованная. С fuzzy > 0 при
+    промахе ищется ближайший вопрос по косинусу символьных n-грамм — перебором,
+    записей немного — среди вопросов с теми же числами. Кэшируются только
+    ответы, от истории не зависящие: вызывающий ищет и кладёт ответ, только
+    если вопрос задан без истории.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        fuzzy: float = RESPONSE_CACHE_FUZZY,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy = fuzzy
+        self._entries: OrderedDict[str, CachedAnswer] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, text: str) -> str | None:
+        key = normalize(text)
+        if len(key) < RESPONSE_CACHE_MIN_CHARS:
+            return None
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is not None:
+            metrics.incr("response_cache.hits")
+        elif self.fuzzy:
+            key, entry = self._nearest(key)
+            if entry is not None:
+                metrics.incr("response_cache.fuzzy_hits")
+        if entry is None:
+            metrics.incr("response_cache.misses")
+            return None
+        self._entries.move_to_end(key)
+        logger.info(f"Response cache hit: '{text}' -> '{key}'.")
+        return entry.answer
+
+    def put(self, text: str, answer: str) -> None:
+        key = normalize(text)
+        if len(key) < RESPONSE_CACHE_MIN_CHARS or not answer:
+            return
+        vector, norm = ngrams(key)
+        self._entries.pop(key, None)
+        self._entries[key] = CachedAnswer(
+            answer, time.monotonic(), vector, norm, numbers(key)
+        )
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.incr("response_cache.evictions")
+
+    def _expire(self) -> None:
+        # Порядок LRU не совпадает с порядком записи, поэтому проверяем все
+        deadline = time.monotonic() - self.ttl
+        expired = [
+            key for key, entry in self._entries.items() if entry.stored_at < deadline
+        ]
+        for key in expired:
+            del self._entries[key]
+            metrics.incr("response_cache.expired")
+
+    def _nearest(self, key: str) -> tuple[str, CachedAnswer | None]:
+        vector, norm = ngrams(key)
+        key_numbers = numbers(key)
+        best_key, best, best_score = key, None, self.fuzzy
+        for candidate, entry in self._entries.items():
+            if entry.numbers != key_numbers:
+                continue
+            score = cosine(vector, norm, entry.vector, entry.norm)
+            if score >= best_score:
+                best_key, best, best_score = candidate, entry, score
+        return best_key, best
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,216 @@
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from app.metrics import metrics
+from app.sber.ai_agent.response_cache import normalize
+
+# Разбирать короткие служебные реплики локально, не отправляя их в LLM
+INTENT_ROUTER = os.getenv("INTENT_ROUTER", "0") == "1"
+# Минимальная уверенность модели; ниже — реплика уходит в LLM
+ROUTER_CONFIDENCE = float(os.getenv("INTENT_ROUTER_CONFIDENCE", "0.95"))
+ROUTER_MAX_WORDS = 5  # Реплики длиннее — всегда открытые вопросы
+# Доля признаков реплики, знакомых модели; на незнакомом тексте она не гадает
+ROUTER_MIN_COVERAGE = 0.6
+
+OPEN = "open"  # Открытый вопрос: отвечает LLM
+# Перебить воспроизведение «стопом» нельзя: пока ответ звучит, клиент не пишет
+# звук, а сервер его не слушает. STOP — реплика между ответами, на которую
+# ассистент просто молчит, а не отправляет «стоп» в LLM.
+STOP = "stop"
+REPEAT = "repeat"
+LOUDER = "louder"
+QUIETER = "quieter"
+GREETING = "greeting"
+THANKS = "thanks"
+GOODBYE = "goodbye"
+
+# Слова, которые не меняют смысла короткой команды
+FILLER_WORDS = {"а", "ну", "давай", "давайте", "пожалуйста", "можно", "ка", "уже"}
+
+KEYWORDS: dict[str, set[str]] = {
+    STOP: {"стоп", "хватит", "замолчи", "замолчите", "помолчи", "тихо", "достаточно"},
+    REPEAT: {"повтори", "повторите", "повторить"},
+    LOUDER: {"громче", "погромче"},
+    QUIETER: {"тише", "потише"},
+    GREETING: {"привет", "здравствуй", "здравствуйте", "приветствую"},
+    THANKS: {"спасибо", "благодарю", "спасибочки"},
+    GOODBYE: {"пока", "прощай", "прощайте"},
+}
+
+PATTERNS: dict[str, re.Pattern] = {
+    STOP: re.compile(r"(?:остановись|прекрати|перестань)(?: говорить)?"),
+    REPEAT: re.compile(
+        r"(?:что|как) (?:ты |вы )?(?:сказал|сказала|сказали)|(?:скажи(?:те)? )?еще раз|"
+        r"не (?:расслышал|расслышала|понял|поняла)(?: повтори(?:те)?)?"
+    ),
+    LOUDER: re.compile(r"(?:сделай(?:те)? |говори(?:те)? )?(?:по)?громче|не слышно"),
+    QUIETER: re.compile(
+        r"(?:сделай(?:те)? |говори(?:те)? )?(?:по)?тише|слишком громко"
+    ),
+    GREETING: re.compile(r"(?:добр(?:ый|ое|ого) (?:день|вечер|утро|утра|дня))"),
+    THANKS: re.compile(r"(?:большое )?спасибо(?: большое| огромное| за помощь)?"),
+    GOODBYE: re.compile(r"до (?:свидания|встречи|завтра)|всего доброго"),
+}
+
+# Обучающие примеры линейной модели: то, что правила не ловят дословно
+EXAMPLES: dict[str, list[str]] = {
+    STOP: ["хватит говорить", "замолчи уже", "остановись пожалуйста", "стоп стоп"],
+    REPEAT: [
+        "повтори еще раз",
+        "можешь повторить",
+        "не расслышал повтори",
+        "скажи еще раз",
+        "еще раз пожалуйста",
+    ],
+    LOUDER: ["погромче пожалуйста", "сделай громче", "тебя не слышно", "говори громче"],
+    QUIETER: ["потише пожалуйста", "сделай тише", "говори тише", "очень громко"],
+    GREETING: ["привет", "здравствуйте", "добрый день", "доброе утро", "привет привет"],
+    THANKS: ["спасибо", "спасибо большое", "благодарю", "спасибо за помощь"],
+    GOODBYE: ["пока", "до свидания", "всего доброго", "пока пока", "до встречи"],
+    OPEN: [
+        "какая погода завтра",
+        "сколько стоит доставка",
+        "расскажи анекдот",
+        "как сбросить пароль",
+        "во сколько вы работаете",
+        "что такое нейросеть",
+        "посоветуй фильм",
+        "как дела",
+        "кто ты",
+        "что ты умеешь",
+        "переведи на английский",
+        "сколько будет 2 плюс 2",
+        "где ближайший банкомат",
+        "почему небо голубое",
+        "напомни мне позвонить",
+        "громкость звука в децибелах",
+        "расскажи еще",
+        "расскажи подробнее",
+        "а что еще",
+        "расскажи про историю",
+        "спасибо а сколько стоит",
+        "стоп а как сбросить пароль",
+    ],
+}
+
+
+# Слова служебных реплик. Модель решает, только если других слов в реплике
+# нет: «почему тише стало» или «скажи еще раз адрес» — уже открытые вопросы,
+# хотя большинство их n-грамм модели знакомо
+INTENT_WORDS = set(FILLER_WORDS).union(
+    *KEYWORDS.values(),
+    *(
+        normalize(text).split()
+        for intent, texts in EXAMPLES.items()
+        if intent != OPEN
+        for text in texts
+    ),
+)
+
+
+def features(key: str) -> Counter:
+    """Признаки реплики: слова и символьные триграммы."""
+    padded = f" {key} "
+    grams = Counter(f"#{padded[i : i + 3]}" for i in range(len(padded) - 2))
+    grams.update(key.split())
+    return grams
+
+
+class IntentModel:
+    """
+    Мультиномиальный наивный Байес по n-граммам — линейная модель.
+
+    Обучается при импорте на EXAMPLES за миллисекунды; предсказание — сумма
+    весов признаков по каждому классу, без зависимостей и без GPU.
+    """
+
+    def __init__(self, examples: dict[str, list[str]], alpha: float = 0.5):
+        counts: dict[str, Counter] = defaultdict(Counter)
+        for intent, texts in examples.items():
+            for text in texts:
+                counts[intent].update(features(normalize(text)))
+        vocabulary = set().union(*counts.values())
+        total = sum(len(texts) for texts in examples.values())
+        self.bias: dict[str, float] = {}
+        self.weights: dict[str, dict[str, float]] = {}
+        self.unknown: dict[str, float] = {}
+        for intent, grams in counts.items():
+            denominator = sum(grams.values()) + alpha * len(vocabulary)
+            self.bias[intent] = math.log(len(examples[intent]) / total)
+            self.weights[intent] = {
+                gram: math.log((count + alpha) / denominator)
+                for gram, count in grams.items()
+            }
+            self.unknown[intent] = math.log(alpha / denominator)
+        self.vocabulary = vocabulary
+
+    def predict(self, key: str) -> tuple[str, float]:
+        """
+        Самый вероятный интент и его апостериорная вероятность.
+
+        Если знакомых модели признаков меньше ROUTER_MIN_COVERAGE, реплика
+        считается открытым вопросом: байесовская оценка по паре случайно
+        совпавших триграмм слишком самоуверенна.
+        """
+        all_grams = features(key)
+        grams = {g: n for g, n in all_grams.items() if g in self.vocabulary}
+        if len(grams) < ROUTER_MIN_COVERAGE * len(all_grams):
+            return OPEN, 0.0
+        scores = {
+            intent: self.bias[intent]
+            + sum(n * weights.get(g, self.unknown[intent]) for g, n in grams.items())
+            for intent, weights in self.weights.items()
+        }
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1 / norm
+
+
+@dataclass
+class Route:
+    intent: str
+    confidence: float  # Уверенность модели в лучшем интенте
+    method: str  # rule, keywords, model или default
+
+
+model = IntentModel(EXAMPLES)
+
+
+def classify(text: str) -> Route:
+    """
+    Куда отправить реплику: локальный обработчик или LLM (OPEN).
+
+    Сначала правила (ключевые слова и регулярные выражения по нормализованному
+    тексту), затем линейная модель. Длинные реплики, реплики со словами вне
+    INTENT_WORDS и всё, в чём модель не уверена, считаются открытыми вопросами.
+    """
+    key = normalize(text)
+    words = [word for word in key.split() if word not in FILLER_WORDS]
+    if not words or len(words) > ROUTER_MAX_WORDS:
+        return Route(OPEN, 1.0, "default")
+    key = " ".join(words)
+    for intent, keywords in KEYWORDS.items():
+        if set(words) <= keywords:
+            return Route(intent, 1.0, "keywords")
+    for intent, pattern in PATTERNS.items():
+        if pattern.fullmatch(key):
+            return Route(intent, 1.0, "rule")
+    if not set(words) <= INTENT_WORDS:
+        return Route(OPEN, 1.0, "default")
+    intent, confidence = model.predict(key)
+    if intent != OPEN and confidence >= ROUTER_CONFIDENCE:
+        return Route(intent, confidence, "model")
+    return Route(OPEN, confidence, "model")
+
+
+def route(text: str) -> Route:
+    """classify() с метриками: интент и время классификации в микросекундах."""
+    started = time.perf_counter()
+    result = classify(text)
+    metrics.observe("router.classify_us", (time.perf_counter() - started) * 1e6)
+    metrics.incr(f"router.intent.{result.intent}")
+    return result
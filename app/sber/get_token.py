@@ -1,11 +1,12 @@
 import uuid
 
-import requests
 from loguru import logger
 
+from app.sber.http_client import post
+
 
 @logger.catch
-def get_token(auth_token, scope) -> dict:
+async def get_token(auth_token, scope) -> dict:
     """
     Выполняет POST-запрос к эндпоинту, который выдает токен.
 
@@ -33,5 +34,5 @@ def get_token(auth_token, scope) -> dict:
     # Тело запроса
     payload = {"scope": scope}
 
-    response = requests.post(url, headers=headers, data=payload, verify=False)
+    response = await post(url, headers=headers, data=payload)
     return response.json()
@@ -0,0 +1,72 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+import httpx
+from loguru import logger
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))  # Общий таймаут запроса, с
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+# Сколько запросов одновременно может быть в полёте к одному хосту
+HTTP_MAX_IN_FLIGHT_PER_HOST = int(os.getenv("HTTP_MAX_IN_FLIGHT_PER_HOST", "32"))
+
+_client: httpx.AsyncClient | None = None
+_host_limits: dict[str, asyncio.Semaphore] = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Общий асинхронный HTTP-клиент процесса.
+
+    Соединения переиспользуются (keep-alive), с серверами, которые это
+    поддерживают, клиент работает по HTTP/2.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            verify=False,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        logger.info("HTTP client created.")
+    return _client
+
+
+def host_limit(url: str) -> asyncio.Semaphore:
+    """Семафор, ограничивающий число запросов в полёте к хосту из url."""
+    host = urlsplit(url).netloc
+    if host not in _host_limits:
+        _host_limits[host] = asyncio.Semaphore(HTTP_MAX_IN_FLIGHT_PER_HOST)
+    return _host_limits[host]
+
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    """POST-запрос через общий клиент с учётом лимита на хост."""
+    async with host_limit(url):
+        return await get_http_client().post(url, **kwargs)
+
+
+@asynccontextmanager
+async def stream(method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+    """Потоковый запрос: тело ответа читается по частям через aiter_bytes()."""
+    async with host_limit(url):
+        async with get_http_client().stream(method, url, **kwargs) as response:
+            yield response
+
+
+async def close_http_client() -> None:
+    """Закрывает общий клиент вместе с пулом соединений."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
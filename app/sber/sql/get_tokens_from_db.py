@@ -1,13 +1,34 @@
 import os
 import sqlite3
+import time
 
 from loguru import logger
 
+# За сколько секунд до истечения считать токен устаревшим
+TOKEN_EXPIRY_MARGIN = 60
+
+# Кэш токенов процесса: имя токена -> {"name", "token", "expires_at"}
+_token_cache: dict[str, dict] = {}
+
+
+def is_token_fresh(token: dict | None, margin: int = TOKEN_EXPIRY_MARGIN) -> bool:
+    """Проверяет, что токен есть и не истекает в ближайшие margin секунд."""
+    # expires_at хранится в миллисекундах
+    return bool(token) and token["expires_at"] // 1000 - int(time.time()) >= margin
+
+
+def cache_token(token: dict) -> None:
+    """Кладёт токен в кэш процесса (вызывается после обновления в БД)."""
+    _token_cache[token["name"]] = token
+
 
 @logger.catch
 def get_token_from_db(token_name) -> dict | None:
     """
-    Получает конкретный токен из таблицы tokens по его имени.
+    Получает конкретный токен по его имени.
+
+    Сначала токен ищется в кэше процесса, в SQLite идём только если его нет
+    в кэше или он скоро истекает.
 
     Параметры:
     - token_name (str): Имя токена (например, 'salute_speech').
@@ -15,6 +36,10 @@ def get_token_from_db(token_name) -> dict | None:
     Возвращает:
     - Словарь с данными о токене или None, если токен не найден.
     """
+    token = _token_cache.get(token_name)
+    if is_token_fresh(token):
+        return token
+
     db_path = os.path.join(os.path.dirname(__file__), "..", "sber.db")
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -28,5 +53,7 @@ def get_token_from_db(token_name) -> dict | None:
     conn.close()
 
     if row:
-        return {"name": row[0], "token": row[1], "expires_at": row[2]}
+        token = {"name": row[0], "token": row[1], "expires_at": row[2]}
+        cache_token(token)
+        return token
     return None  # Если токен не найден
@@ -1,75 +1,109 @@
 # Функция для обновления токенов в базе данных
-import time
+import asyncio
 import os
+import time
 
-import urllib3
 from dotenv import load_dotenv
 import sqlite3
 
 from loguru import logger
 
 from app.sber.get_token import get_token
+from app.sber.sql.get_tokens_from_db import (
+    TOKEN_EXPIRY_MARGIN,
+    cache_token,
+    get_token_from_db,
+    is_token_fresh,
+)
 
 load_dotenv()
 
 SALUTE_SPEECH_API_KEY = os.getenv("SALUTE_SPEECH_API_KEY")
 GIGACHAT_API_KEY = os.getenv("GIGACHAT_API_KEY")
 
-urllib3.disable_warnings(
-    urllib3.exceptions.InsecureRequestWarning
-)  # Игнорируем предупреждение об отсутствии проверки сертификата SSL
+# Токены, которые поддерживаются в актуальном состоянии
+TOKENS_TO_CHECK = ["salute_speech", "giga_chat"]
+# Фоновое обновление начинается заранее, задолго до истечения токена
+REFRESH_AHEAD = int(os.getenv("TOKEN_REFRESH_AHEAD", "300"))
+REFRESH_MIN_INTERVAL = 5  # Пауза между попытками после ошибки, с
+REFRESH_MAX_INTERVAL = 60  # Максимальная пауза между проверками, с
 
+# По одной блокировке на токен: одновременно идёт только одно обновление
+_refresh_locks: dict[str, asyncio.Lock] = {}
 
-@logger.catch
-def update_tokens_if_needed() -> None:
-    # Подключаемся к базе данных
+
+def save_token(token_name: str, token: str, expires_at: int) -> None:
+    """Сохраняет токен в БД и в кэш процесса."""
     db_path = os.path.join(os.path.dirname(__file__), "..", "sber.db")
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Токены, которые нужно проверить
-    tokens_to_check = ["salute_speech", "giga_chat"]
-
-    for token_name in tokens_to_check:
-        # Проверяем, существует ли токен в таблице
-        cursor.execute("SELECT expires_at FROM tokens WHERE name = ?", (token_name,))
-        row = cursor.fetchone()
-
-        current_time = int(time.time())  # Текущее время в секундах
-        expires_at = row[0] if row else None
-
-        # Если токена нет или срок действия истекает менее чем через минуту
-        if not row or (expires_at // 1000 - current_time < 60):
-            logger.info(f"Токен {token_name} отсутствует или истекает. Обновление...")
-
-            # Получаем новый токен
-            scope = (
-                "SALUTE_SPEECH_PERS"
-                if token_name == "salute_speech"
-                else "GIGACHAT_API_PERS"
-            )
-            auth_token = (
-                SALUTE_SPEECH_API_KEY
-                if token_name == "salute_speech"
-                else GIGACHAT_API_KEY
-            )
-            token_data = get_token(auth_token, scope)
-
-            if "access_token" in token_data and "expires_at" in token_data:
-                new_token = token_data["access_token"]
-                new_expires_at = token_data["expires_at"]
-
-                cursor.execute(
-                    """
-                    INSERT OR REPLACE INTO tokens (name, token, expires_at)
-                    VALUES (?, ?, ?)
-                """,
-                    (token_name, new_token, new_expires_at),
-                )
-
-                logger.info(f"Токен {token_name} успешно обновлен.")
-            else:
-                logger.error(f"Не удалось получить токен {token_name}: {token_data}")
-
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO tokens (name, token, expires_at)
+        VALUES (?, ?, ?)
+    """,
+        (token_name, token, expires_at),
+    )
     conn.commit()
     conn.close()
+    cache_token({"name": token_name, "token": token, "expires_at": expires_at})
+
+
+async def refresh_token(token_name: str, margin: int = TOKEN_EXPIRY_MARGIN) -> None:
+    """
+    Обновляет токен, если он отсутствует или истекает в ближайшие margin секунд.
+
+    Параллельные вызовы для одного токена не порождают лишних запросов:
+    пока идёт обновление, остальные ждут его и получают готовый результат.
+    """
+    lock = _refresh_locks.setdefault(token_name, asyncio.Lock())
+    async with lock:
+        # Пока ждали блокировку, токен мог обновить кто-то другой
+        if is_token_fresh(get_token_from_db(token_name), margin):
+            return
+
+        logger.info(f"Токен {token_name} отсутствует или истекает. Обновление...")
+
+        # Получаем новый токен
+        scope = (
+            "SALUTE_SPEECH_PERS"
+            if token_name == "salute_speech"
+            else "GIGACHAT_API_PERS"
+        )
+        auth_token = (
+            SALUTE_SPEECH_API_KEY if token_name == "salute_speech" else GIGACHAT_API_KEY
+        )
+        token_data = await get_token(auth_token, scope)
+
+        if token_data and "access_token" in token_data and "expires_at" in token_data:
+            save_token(token_name, token_data["access_token"], token_data["expires_at"])
+            logger.info(f"Токен {token_name} успешно обновлен.")
+        else:
+            logger.error(f"Не удалось получить токен {token_name}: {token_data}")
+
+
+@logger.catch
+async def update_tokens_if_needed(margin: int = TOKEN_EXPIRY_MARGIN) -> None:
+    # Свежие токены берутся из кэша процесса, к OAuth идём только за устаревшими
+    for token_name in TOKENS_TO_CHECK:
+        if not is_token_fresh(get_token_from_db(token_name), margin):
+            await refresh_token(token_name, margin)
+
+
+def seconds_until_refresh() -> float:
+    """Через сколько секунд какому-либо токену понадобится фоновое обновление."""
+    now = time.time()
+    delays = []
+    for token_name in TOKENS_TO_CHECK:
+        token = get_token_from_db(token_name)
+        if not token:
+            return REFRESH_MIN_INTERVAL
+        delays.append(token["expires_at"] / 1000 - REFRESH_AHEAD - now)
+    return min(max(min(delays), REFRESH_MIN_INTERVAL), REFRESH_MAX_INTERVAL)
+
+
+async def refresh_tokens_forever() -> None:
+    """Фоновая задача: обновляет токены заранее, пока работает приложение."""
+    logger.info("Token refresher started.")
+    while True:
+        await update_tokens_if_needed(margin=REFRESH_AHEAD)
+        await asyncio.sleep(seconds_until_refresh())
@@ -0,0 +1,133 @@
+import hashlib
+import mmap
+import os
+from collections import OrderedDict
+
+from loguru import logger
+
+from app.metrics import metrics
+
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR")  # Дисковый уровень включается, если задан
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+
+
+def cache_key(text: str, voice: str, format: str) -> str:
+    """Ключ кэша: хэш текста вместе с голосом и форматом."""
+    return hashlib.sha256(f"{format}\0{voice}\0{text}".encode()).hexdigest()
+
+
+class TTSCache:
+    """
+    Двухуровневый кэш синтезированного аудио.
+
+    Память — LRU с ограничением по суммарному размеру. Диск (необязательный) —
+    файлы по ключу, читаются через mmap, вытесняются самые давно
+    использованные при превышении лимита. Попадание на диске поднимает запись
+    в память.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = TTS_CACHE_MEMORY_BYTES,
+        disk_dir: str | None = TTS_CACHE_DIR,
+        max_disk_bytes: int = TTS_CACHE_DISK_BYTES,
+        name: str = "tts_cache",
+    ):
+        self.name = name  # Префикс счётчиков в метриках
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()  # ключ -> размер файла
+        self._disk_bytes = 0
+        if disk_dir:
+            self._load_disk_index()
+
+    def get(self, key: str) -> bytes | None:
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            metrics.incr(f"{self.name}.memory_hits")
+            return audio
+
+        audio = self._read_disk(key)
+        if audio is not None:
+            metrics.incr(f"{self.name}.disk_hits")
+            self._put_memory(key, audio)
+            return audio
+
+        metrics.incr(f"{self.name}.misses")
+        return None
+
+    def put(self, key: str, audio: bytes) -> None:
+        self._put_memory(key, audio)
+        if self.disk_dir and key not in self._disk:
+            self._write_disk(key, audio)
+
+    def _put_memory(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            metrics.incr(f"{self.name}.memory_evictions")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key)
+
+    def _load_disk_index(self) -> None:
+        os.makedirs(self.disk_dir, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        logger.info(
+            f"{self.name} on disk: {len(self._disk)} entries, {self._disk_bytes} bytes."
+        )
+
+    def _read_disk(self, key: str) -> bytes | None:
+        if key not in self._disk:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    audio = mapped[:]
+            os.utime(self._path(key))  # Отмечаем использование для LRU после рестарта
+        except (OSError, ValueError):
+            self._disk_bytes -= self._disk.pop(key)
+            return None
+        self._disk.move_to_end(key)
+        return audio
+
+    def _write_disk(self, key: str, audio: bytes) -> None:
+        tmp_path = self._path(key) + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Failed to write TTS cache entry: {e}")
+            return
+        self._disk[key] = len(audio)
+        self._disk_bytes += len(audio)
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            evicted, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            metrics.incr(f"{self.name}.disk_evictions")
+            try:
+                os.remove(self._path(evicted))
+            except OSError:
+                pass
+
+
+tts_cache = TTSCache()
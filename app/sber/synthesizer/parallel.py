@@ -0,0 +1,83 @@
+import asyncio
+import os
+from typing import AsyncIterator, Callable
+
+from app.sber.synthesizer.synthesizer import stream_speech
+
+# Сколько сегментов одной сессии синтезируется одновременно
+TTS_PARALLELISM = int(os.getenv("TTS_PARALLELISM", "3"))
+
+
+class Segment:
+    """Один сегмент ответа: текст и очередь его аудиофреймов (None — конец)."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.frames: asyncio.Queue[bytes | None] = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+
+
+class OrderedSynthesis:
+    """
+    Параллельный синтез сегментов с выдачей аудио строго по порядку.
+
+    Каждый добавленный сегмент сразу начинает синтезироваться (в пределах
+    общего семафора сессии), а frames() отдаёт фреймы первого сегмента по мере
+    скачивания, затем уже готовые фреймы следующих и т.д.
+    """
+
+    def __init__(
+        self,
+        limit: asyncio.Semaphore,
+        synthesize: Callable[[str], AsyncIterator[bytes]] = stream_speech,
+    ):
+        self.limit = limit
+        self.synthesize = synthesize
+        self._segments: asyncio.Queue[Segment | None] = asyncio.Queue()
+        self._all: list[Segment] = []
+        self.closed = False
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    def add(
+        self,
+        text: str,
+        synthesize: Callable[[str], AsyncIterator[bytes]] | None = None,
+    ) -> Segment:
+        """Добавляет сегмент; synthesize заменяет синтезатор для него одного."""
+        segment = Segment(text)
+        synthesize = synthesize or self.synthesize
+        segment.task = asyncio.create_task(self._run(segment, synthesize))
+        self._all.append(segment)
+        self._segments.put_nowait(segment)
+        return segment
+
+    def close(self) -> None:
+        """Больше сегментов не будет."""
+        self.closed = True
+        self._segments.put_nowait(None)
+
+    async def _run(
+        self, segment: Segment, synthesize: Callable[[str], AsyncIterator[bytes]]
+    ) -> None:
+        try:
+            async with self.limit:
+                async for frame in synthesize(segment.text):
+                    segment.frames.put_nowait(frame)
+        finally:
+            segment.frames.put_nowait(None)
+
+    async def segments(self) -> AsyncIterator[Segment]:
+        """Сегменты в порядке добавления."""
+        while (segment := await self._segments.get()) is not None:
+            yield segment
+
+    async def frames(self, segment: Segment) -> AsyncIterator[bytes]:
+        """Фреймы сегмента по мере готовности."""
+        while (frame := await segment.frames.get()) is not None:
+            yield frame
+
+    def cancel(self) -> None:
+        for segment in self._all:
+            segment.task.cancel()
@@ -0,0 +1,102 @@
+import asyncio
+import itertools
+import os
+from typing import AsyncIterator
+
+from loguru import logger
+
+from app.const import FILLERS, PHRASES
+from app.metrics import metrics
+from app.sber.synthesizer.cache import TTSCache, cache_key, tts_cache
+from app.sber.synthesizer.synthesizer import (
+    DEFAULT_VOICE,
+    STREAM_FORMAT,
+    frame_bytes_for,
+    synthesize_speech,
+)
+
+current_file = os.path.abspath(__file__)
+project_root = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.dirname(current_file)))
+)
+PHRASE_BANK_DIR = os.getenv(
+    "PHRASE_BANK_DIR", os.path.join(project_root, "phrase_bank")
+)
+PHRASE_BANK_BYTES = 64 * 1024 * 1024  # Фраз немного: вытеснения не ожидается
+
+
+class PhraseBank:
+    """
+    Банк заранее синтезированных фраз: приветствия, «секунду», извинения.
+
+    Аудио хранится по тем же ключам, что и кэш синтеза (текст, голос, формат),
+    в памяти и в отдельном каталоге на диске, поэтому переживает рестарт.
+    Фразы синтезируются при старте (warm) или при первом обращении; пока
+    фразы нет, get() возвращает None и не ждёт синтеза.
+    """
+
+    def __init__(
+        self, phrases: dict[str, str] = PHRASES, store: TTSCache | None = None
+    ):
+        self.phrases = phrases
+        self.store = store or TTSCache(
+            max_memory_bytes=PHRASE_BANK_BYTES,
+            disk_dir=PHRASE_BANK_DIR,
+            max_disk_bytes=PHRASE_BANK_BYTES,
+            name="phrase_bank",
+        )
+        self._pending: dict[str, asyncio.Task] = {}
+        self._fillers = itertools.cycle(FILLERS)
+
+    def get(self, name: str, format: str, voice: str) -> bytes | None:
+        """Аудио фразы, если оно уже есть; иначе синтез запускается в фоне."""
+        key = cache_key(self.phrases[name], voice, format)
+        audio = self.store.get(key)
+        if audio is None and key not in self._pending:
+            task = asyncio.create_task(self._synthesize(key, name, format, voice))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return audio
+
+    async def _synthesize(self, key: str, name: str, format: str, voice: str) -> None:
+        audio = await synthesize_speech(self.phrases[name], format=format, voice=voice)
+        if audio:
+            self.store.put(key, audio)
+            metrics.incr("phrase_bank.synthesized")
+            logger.info(f"Phrase '{name}' synthesized ({format}, {voice}).")
+
+    async def warm(
+        self, format: str = STREAM_FORMAT, voice: str = DEFAULT_VOICE
+    ) -> None:
+        """
+        Готовит все фразы в заданном формате.
+
+        Готовые фразы заодно кладутся в общий кэш синтеза: если та же фраза
+        понадобится в обычном ответе (например, извинение), она не синтезируется.
+        """
+        for name, text in self.phrases.items():
+            audio = self.get(name, format, voice)
+            if audio is not None:
+                tts_cache.put(cache_key(text, voice, format), audio)
+        await asyncio.gather(*self._pending.values(), return_exceptions=True)
+        logger.info(
+            f"Phrase bank ready: {len(self.phrases)} phrases ({format}, {voice})."
+        )
+
+    def next_filler(self, format: str, voice: str) -> tuple[str, bytes] | None:
+        """Следующая по кругу готовая фраза-заполнитель."""
+        name = next(self._fillers)
+        audio = self.get(name, format, voice)
+        if audio is None:
+            return None
+        return self.phrases[name], audio
+
+
+async def replay(audio: bytes, voice: str) -> AsyncIterator[bytes]:
+    """Отдаёт готовое аудио фреймами, как stream_speech."""
+    frame_bytes = frame_bytes_for(voice)
+    for start in range(0, len(audio), frame_bytes):
+        yield audio[start : start + frame_bytes]
+
+
+phrase_bank = PhraseBank()
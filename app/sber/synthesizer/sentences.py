@@ -0,0 +1,72 @@
+import re
+from typing import AsyncIterator
+
+# Конец предложения: знак препинания, закрывающие кавычки/скобки, пробел и
+# заглавная буква следом (так "т. е." не режется посередине)
+SENTENCE_END = re.compile(r"(?<=[.!?…])[\"»)\]]*\s+(?=[A-ZА-ЯЁ0-9«\"(—-])|\n+")
+MIN_SENTENCE_LENGTH = 20  # Короткие обрывки ("Да.", "Т. е.") склеиваем со следующими
+
+
+def split_sentences(
+    text: str, min_length: int = MIN_SENTENCE_LENGTH
+) -> tuple[list[str], str]:
+    """
+    Делит текст на законченные предложения.
+
+    Возвращает:
+    - список законченных предложений и хвост, который ещё может продолжиться.
+    """
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        candidate = text[start : match.end()].strip()
+        if len(candidate) < min_length:
+            continue
+        sentences.append(candidate)
+        start = match.end()
+    return sentences, text[start:]
+
+
+async def iter_sentences(
+    tokens: AsyncIterator[str], min_length: int = MIN_SENTENCE_LENGTH
+) -> AsyncIterator[str]:
+    """Собирает поток токенов LLM в предложения, отдавая каждое сразу после его конца."""
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        sentences, buffer = split_sentences(buffer, min_length)
+        for sentence in sentences:
+            yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+
+CLAUSE_END = re.compile(r"(?<=[,;:])\s+|\s+(?=—)")
+MAX_CLAUSE_LENGTH = 120  # Предложения длиннее этого режем по запятым и тире
+
+
+def split_clauses(sentence: str, max_length: int = MAX_CLAUSE_LENGTH) -> list[str]:
+    """Делит длинное предложение на части по границам придаточных, не длиннее max_length."""
+    if len(sentence) <= max_length:
+        return [sentence]
+    parts = []
+    current = ""
+    for piece in CLAUSE_END.split(sentence):
+        if current and len(current) + 1 + len(piece) > max_length:
+            parts.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}".strip()
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_segments(text: str, clauses: bool = False) -> list[str]:
+    """Делит готовый текст на сегменты для синтеза: предложения или их части."""
+    sentences, rest = split_sentences(text)
+    if rest.strip():
+        sentences.append(rest.strip())
+    if clauses:
+        return [clause for sentence in sentences for clause in split_clauses(sentence)]
+    return sentences
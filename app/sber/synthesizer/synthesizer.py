@@ -1,22 +1,150 @@
-import requests
+from typing import AsyncIterator
+
+import httpx
 from loguru import logger
 
+from app.sber import http_client
 from app.sber.sql.get_tokens_from_db import get_token_from_db
+from app.sber.synthesizer.cache import cache_key, tts_cache
 
+SYNTHESIZE_URL = "https://smartspeech.sber.ru/rest/v1/text:synthesize"
+DEFAULT_VOICE = "Bys_24000"
+AUDIO_FRAME_BYTES = 8192  # Размер аудиофрейма для DEFAULT_VOICE (чётный — PCM16)
+# Более длинные ответы при стриминге не кэшируются
+MAX_CACHEABLE_BYTES = 2 * 1024 * 1024
 
-@logger.catch
-def synthesize_speech(text, format="wav16", voice="Bys_24000") -> bytes:
-    url = "https://smartspeech.sber.ru/rest/v1/text:synthesize"
-    headers = {
+# Для стриминга — сырой PCM16 без заголовка: клиент может играть любой фрейм,
+# частота дискретизации задаётся голосом (суффикс _24000 / _8000)
+STREAM_FORMAT = "pcm16"
+# Форматы, которые клиент может выбрать при подключении. opus — OGG/Opus:
+# каждый сегмент ответа приходит целым файлом, клиент декодирует его сам
+STREAM_FORMATS = {STREAM_FORMAT, "opus"}
+VOICE_SAMPLE_RATES = {24000, 8000}
+
+
+def voice_sample_rate(voice: str) -> int:
+    """Частота дискретизации голоса по его суффиксу (Bys_24000 -> 24000)."""
+    return int(voice.rsplit("_", 1)[-1])
+
+
+def audio_duration_ms(audio: bytes, format: str, voice: str) -> float:
+    """
+    Длительность готового аудио: PCM16 — по числу сэмплов, OGG/Opus — по
+    гранульной позиции последней страницы (у Opus она в отсчётах 48 кГц).
+    """
+    if format == STREAM_FORMAT:
+        return len(audio) / 2 / voice_sample_rate(voice) * 1000
+    page = audio.rfind(b"OggS")
+    if page < 0 or len(audio) < page + 14:
+        return 0.0
+    return int.from_bytes(audio[page + 6 : page + 14], "little") / 48
+
+
+def voice_for_rate(sample_rate: int, voice: str = DEFAULT_VOICE) -> str:
+    """Тот же голос с другой частотой дискретизации (Bys_24000 -> Bys_8000)."""
+    return f"{voice.rsplit('_', 1)[0]}_{sample_rate}"
+
+
+def frame_bytes_for(voice: str) -> int:
+    """
+    Размер фрейма для голоса: длительность фрейма одинакова при любой частоте,
+    иначе на 8 кГц первый фрейм копился бы втрое дольше.
+    """
+    scale = voice_sample_rate(voice) / voice_sample_rate(DEFAULT_VOICE)
+    size = int(AUDIO_FRAME_BYTES * scale)
+    return size - size % 2
+
+
+def negotiate_output(format: str | None, sample_rate: str | None) -> tuple[str, str]:
+    """
+    Формат и голос ответа по запросу клиента.
+
+    Неизвестные значения заменяются умолчаниями: PCM16 и DEFAULT_VOICE.
+    """
+    if format not in STREAM_FORMATS:
+        format = STREAM_FORMAT
+    rate = int(sample_rate) if sample_rate and sample_rate.isdigit() else 0
+    voice = voice_for_rate(rate) if rate in VOICE_SAMPLE_RATES else DEFAULT_VOICE
+    return format, voice
+
+
+def _headers() -> dict:
+    return {
         "Authorization": f"Bearer {get_token_from_db('salute_speech').get('token')}",
         "Content-Type": "application/text",
     }
+
+
+@logger.catch
+async def synthesize_speech(text, format="wav16", voice=DEFAULT_VOICE) -> bytes:
+    # Повторяющиеся фразы отдаются из кэша без обращения к сервису
+    key = cache_key(text, voice, format)
+    audio = tts_cache.get(key)
+    if audio is not None:
+        return audio
+
     params = {"format": format, "voice": voice}
-    response = requests.post(
-        url, headers=headers, params=params, data=text.encode(), verify=False
+    response = await http_client.post(
+        SYNTHESIZE_URL, headers=_headers(), params=params, content=text.encode()
     )
 
     if response.status_code == 200:
+        tts_cache.put(key, response.content)
         return response.content
     else:
         logger.error(f"Ошибка синтеза: {response.status_code} - {response.json()}")
+
+
+async def stream_speech(
+    text, format=STREAM_FORMAT, voice=DEFAULT_VOICE, frame_bytes=None
+) -> AsyncIterator[bytes]:
+    """
+    Потоковый синтез: отдаёт аудио фреймами по frame_bytes по мере скачивания
+    (по умолчанию — frame_bytes_for(voice)).
+
+    Ответ сервиса целиком в памяти не держится — копится только для кэша и
+    только пока не превышен MAX_CACHEABLE_BYTES.
+    """
+    frame_bytes = frame_bytes or frame_bytes_for(voice)
+    key = cache_key(text, voice, format)
+    audio = tts_cache.get(key)
+    if audio is not None:
+        for start in range(0, len(audio), frame_bytes):
+            yield audio[start : start + frame_bytes]
+        return
+
+    params = {"format": format, "voice": voice}
+    cached: bytearray | None = bytearray()
+    try:
+        async with http_client.stream(
+            "POST",
+            SYNTHESIZE_URL,
+            headers=_headers(),
+            params=params,
+            content=text.encode(),
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                logger.error(
+                    f"Ошибка синтеза: {response.status_code} - {response.text}"
+                )
+                return
+
+            pending = bytearray()
+            async for chunk in response.aiter_bytes():
+                if cached is not None:
+                    cached += chunk
+                    if len(cached) > MAX_CACHEABLE_BYTES:
+                        cached = None
+                pending += chunk
+                while len(pending) >= frame_bytes:
+                    yield bytes(pending[:frame_bytes])
+                    del pending[:frame_bytes]
+            if pending:
+                yield bytes(pending)
+    except httpx.HTTPError as e:
+        logger.error(f"Ошибка синтеза: {e!r}")
+        return
+
+    if cached is not None:
+        tts_cache.put(key, bytes(cached))
@@ -0,0 +1,65 @@
+import itertools
+import os
+
+import grpc
+from loguru import logger
+
+GRPC_POOL_SIZE = int(os.getenv("GRPC_POOL_SIZE", "2"))
+
+# Keepalive держит HTTP/2-соединение тёплым между репликами, а отдельный
+# пул сабканалов у каждого канала даёт каждому свой TCP/TLS-коннект
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30_000),
+    ("grpc.keepalive_timeout_ms", 10_000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+
+class ChannelPool:
+    """
+    Пул долгоживущих защищённых gRPC-каналов к одному хосту.
+
+    Каналы создаются лениво (внутри работающего event loop) и раздаются по
+    кругу; множество стримов Recognize мультиплексируется поверх HTTP/2.
+    Токен в канал не зашивается — он передаётся в каждом вызове отдельно.
+    """
+
+    def __init__(self, host: str, ca_path: str | None, size: int = GRPC_POOL_SIZE):
+        self.host = host
+        self.ca_path = ca_path
+        self.size = size
+        self._channels: list[grpc.aio.Channel] = []
+        self._next = None
+        self._ssl_credentials = None
+
+    def get(self) -> grpc.aio.Channel:
+        """Возвращает следующий канал пула."""
+        if not self._channels:
+            self._open()
+        return next(self._next)
+
+    def _open(self) -> None:
+        if self._ssl_credentials is None:
+            root_certificates = None
+            if self.ca_path:
+                with open(self.ca_path, "rb") as f:
+                    root_certificates = f.read()
+            self._ssl_credentials = grpc.ssl_channel_credentials(
+                root_certificates=root_certificates
+            )
+        self._channels = [
+            grpc.aio.secure_channel(
+                self.host, self._ssl_credentials, options=CHANNEL_OPTIONS
+            )
+            for _ in range(self.size)
+        ]
+        self._next = itertools.cycle(self._channels)
+        logger.info(f"Opened {self.size} gRPC channels to {self.host}.")
+
+    async def close(self) -> None:
+        """Закрывает все каналы пула."""
+        channels, self._channels = self._channels, []
+        for channel in channels:
+            await channel.close()
@@ -0,0 +1,58 @@
+from typing import Iterator
+
+RING_FRAMES = 4  # Ёмкость кольца в кадрах: запись и чтение чередуются, больше не нужно
+
+
+class AudioRingBuffer:
+    """
+    Кольцевой буфер, нарезающий поток аудио на кадры фиксированного размера.
+
+    Память выделяется один раз. Ёмкость кратна размеру кадра, а кадры читаются
+    с выровненных позиций, поэтому кадр никогда не переходит через конец кольца
+    и отдаётся как memoryview на буфер, без копирования. Кадр действителен до
+    следующей записи.
+    """
+
+    def __init__(self, frame_bytes: int, frames: int = RING_FRAMES):
+        self.frame_bytes = frame_bytes
+        self.capacity = frame_bytes * frames
+        self._view = memoryview(bytearray(self.capacity))
+        self._read = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def write(self, data: bytes | memoryview) -> int:
+        """Записывает сколько поместится; возвращает число записанных байт."""
+        n = min(len(data), self.capacity - self._size)
+        start = (self._read + self._size) % self.capacity
+        first = min(n, self.capacity - start)
+        self._view[start : start + first] = data[:first]
+        self._view[: n - first] = data[first:n]
+        self._size += n
+        return n
+
+    def frames(self) -> Iterator[memoryview]:
+        """Все накопленные полные кадры."""
+        while self._size >= self.frame_bytes:
+            frame = self._view[self._read : self._read + self.frame_bytes]
+            self._read = (self._read + self.frame_bytes) % self.capacity
+            self._size -= self.frame_bytes
+            yield frame
+
+    def flush(self) -> memoryview | None:
+        """Остаток неполного кадра (после frames() он лежит одним куском)."""
+        if not self._size:
+            return None
+        rest = self._view[self._read : self._read + self._size]
+        self._read = self._size = 0
+        return rest
+
+    def drain(self) -> bytes:
+        """Всё содержимое по порядку, в том числе через конец кольца; буфер пустеет."""
+        end = self._read + self._size
+        data = bytes(self._view[self._read : min(end, self.capacity)])
+        data += bytes(self._view[: max(0, end - self.capacity)])
+        self._read = self._size = 0
+        return data
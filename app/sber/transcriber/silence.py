@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+
+from app.sber.transcriber.vad import VAD_FRAME_MS
+
+# Локальное определение конца реплики по тишине во входящем PCM
+LOCAL_SILENCE_DETECTION = os.getenv("LOCAL_SILENCE_DETECTION", "0") == "1"
+# Сколько тишины после речи считать концом реплики
+END_OF_TURN_SILENCE_MS = int(os.getenv("END_OF_TURN_SILENCE_MS", "500"))
+
+
+class SilenceDetector:
+    """
+    Детектор конца реплики по решениям VAD.
+
+    Речь и тишину различает VoiceGate (энергия в dBFS с адаптивным порогом и
+    ZCR) — детектор лишь считает голосовые и тихие кадры. Срабатывает, когда
+    после хотя бы одного голосового кадра набралось silence_ms тишины подряд.
+    Длительность считается по числу кадров, а не по времени прихода чанков,
+    поэтому не зависит от сети.
+    """
+
+    def __init__(self, silence_ms: int = END_OF_TURN_SILENCE_MS):
+        self.silence_frames = silence_ms // VAD_FRAME_MS
+        self.heard_speech = False
+        self._silent = 0
+
+    def feed(self, voiced: np.ndarray) -> bool:
+        """Учитывает решения VAD по кадрам чанка; True — реплика закончилась."""
+        if voiced.any():
+            self.heard_speech = True
+            # Тишина считается от последнего голосового кадра
+            self._silent = len(voiced) - 1 - int(np.flatnonzero(voiced)[-1])
+        else:
+            self._silent += len(voiced)
+        return self.heard_speech and self._silent >= self.silence_frames
@@ -1,27 +1,37 @@
-import itertools
+import asyncio
 import os
-from typing import Generator
-
-import redis
+from typing import AsyncGenerator
 
 from loguru import logger
 import grpc  # noqa (poetry add grpcio)
 
+from app.metrics import metrics
 from app.sber.sql.get_tokens_from_db import get_token_from_db
 from app.sber.transcriber import recognition_pb2, recognition_pb2_grpc
+from app.sber.transcriber.channel_pool import ChannelPool
+from app.sber.transcriber.ring_buffer import AudioRingBuffer
 
 SAMPLE_RATE = 16000
+# Сколько миллисекунд аудио отправлять в одном RecognitionRequest
+STT_CHUNK_MS = int(os.getenv("STT_CHUNK_MS", "100"))
+STT_CHUNK_BYTES = SAMPLE_RATE * 2 * STT_CHUNK_MS // 1000  # PCM16, моно
 output_file = "output.pcm"
 current_file = os.path.abspath(__file__)
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(current_file))))
 cert_path = os.path.join(project_root, "rtr_ca.pem")
-SALUTE_SPEECH_TOKEN = get_token_from_db("salute_speech").get("token")
+SMARTSPEECH_HOST = "smartspeech.sber.ru"
+# Один долгий поток распознавания с multi-utterance на всю сессию
+STT_MULTI_UTTERANCE = os.getenv("STT_MULTI_UTTERANCE", "0") == "1"
+RECONNECT_MAX_DELAY = 5.0  # Потолок паузы между неудачными переподключениями
+# Пауза после речи, по которой распознаватель ставит eou
+EOU_TIMEOUT_MS = int(os.getenv("EOU_TIMEOUT_MS", "300"))
 
 ENCODING_PCM = "pcm"
+ENCODING_OPUS = "opus"  # Opus в контейнере OGG, как его пишет браузер
 
 ENCODINGS_MAP = {
     ENCODING_PCM: recognition_pb2.RecognitionOptions.AudioEncoding.PCM_S16LE,
-    "opus": recognition_pb2.RecognitionOptions.AudioEncoding.OPUS,
+    ENCODING_OPUS: recognition_pb2.RecognitionOptions.AudioEncoding.OPUS,
     "mp3": recognition_pb2.RecognitionOptions.AudioEncoding.MP3,
     "flac": recognition_pb2.RecognitionOptions.AudioEncoding.FLAC,
     "alaw": recognition_pb2.RecognitionOptions.AudioEncoding.ALAW,
@@ -34,7 +44,7 @@ ENCODINGS_MAP = {
 # TODO: SpeakerSeparationOptions.enable - добавить определение голосов
 # TODO: Нейронки для определения конца фразы (https://www.perplexity.ai/search/ia-sobiraius-sobrat-golosovogo-JCO9hxAnRGKGIeTtT3f9LA)
 # TODO: RAG (https://habr.com/ru/articles/779526/)
-# TODO: Нейронка для определения - к чему обращаться и где искать
+# TODO: Нейронка для определения, где искать ответ (к чему обращаться — app/sber/ai_agent/router.py)
 
 
 class Arguments:
@@ -99,73 +109,180 @@ class Arguments:
             setattr(obj, key, value)
 
 
-r = redis.StrictRedis(host="redis")
-
-
-def generate_audio_chunks_from_redis() -> Generator[recognition_pb2.RecognitionRequest, None, None]:
-    """Генератор, который читает аудиоданные из Redis."""
-    logger.info("Starting to read audio chunks from Redis...")
-    while True:
-        chunk = r.brpop(["audio_chunks"], timeout=5)  # Ожидаем данные с тайм-аутом
-        if chunk is None:
-            logger.debug("No audio chunks available, waiting...")
-            continue
-        _, audio_data = chunk  # Извлекаем данные (игнорируем ключ)
-        logger.debug(f"Received chunk from Redis: {len(audio_data)} bytes")
-        yield recognition_pb2.RecognitionRequest(audio_chunk=audio_data)
+# Общие для всех сессий каналы к SmartSpeech
+channel_pool = ChannelPool(SMARTSPEECH_HOST, cert_path)
 
 
-def recognize() -> None:
+def build_arguments(
+    multi_utterance: bool = False, encoding: str = ENCODING_PCM
+) -> Arguments:
+    """Собирает параметры распознавания для SmartSpeech."""
     args = Arguments()
-    args.host = "smartspeech.sber.ru"
+    args.host = SMARTSPEECH_HOST
     args.ca = cert_path
-    args.token = SALUTE_SPEECH_TOKEN
-    args.audio_encoding = ENCODINGS_MAP[ENCODING_PCM]
+    args.token = get_token_from_db("salute_speech").get("token")
+    args.audio_encoding = ENCODINGS_MAP[encoding]
     args.channels_count = 1  # Количество каналов
     args.enable_partial_results = True
-    #  args.enable_multi_utterance = True
+    if multi_utterance:
+        args.enable_multi_utterance = True
     args.enable_vad = True  # TODO: Что это?
     args.metadata = []
     args.sample_rate = SAMPLE_RATE  # Частота дискретизации
     args.language = "ru-RU"  # Язык
     args.no_speech_timeout = "4s"  # Таймаут без речи
     args.max_speech_timeout = "20s"  # Максимальный таймаут речи
+    args.hints_eou_timeout = f"{EOU_TIMEOUT_MS / 1000}s"  # Пауза до конца фразы
+    return args
 
-    ssl_cred = grpc.ssl_channel_credentials(
-        root_certificates=open(args.ca, "rb").read() if args.ca else None,
-    )
-    token_cred = grpc.access_token_call_credentials(args.token)
 
-    channel = grpc.secure_channel(
-        args.host, grpc.composite_channel_credentials(ssl_cred, token_cred)
-    )
+async def generate_audio_requests(
+    options: recognition_pb2.RecognitionOptions,
+    audio_queue: asyncio.Queue,
+    reframe: bool = True,
+    unsent: bytearray | None = None,
+) -> AsyncGenerator[recognition_pb2.RecognitionRequest, None]:
+    """
+    Генератор запросов для gRPC-стрима: сначала параметры, затем аудио из очереди.
+
+    Мелкие фрагменты PCM складываются в кольцевой буфер, а в поток уходят
+    кадрами ровно по STT_CHUNK_MS. Фрагмент не короче кадра (ScriptProcessor
+    присылает по 256 мс) уходит как есть — вместе с недобранным кадром из
+    кольца, если тот есть: сообщений в секунду не больше 1000 / STT_CHUNK_MS,
+    а крупное аудио не копируется и не дробится. Сжатое аудио
+    (reframe=False) уходит как есть. Поток завершается, когда в очередь
+    положили None, — тогда досылается неполный последний кадр.
+
+    Если генератор закрыли раньше (вызов закончился), аудио, которое не ушло
+    в поток — кадр, чья запись не подтверждена, и остаток буфера, — кладётся
+    в unsent; со следующего потока с тем же unsent оно отправляется первым.
+    """
+    ring = AudioRingBuffer(STT_CHUNK_BYTES) if reframe else None
+    yield recognition_pb2.RecognitionRequest(options=options)
+    pending = bytes(unsent) if unsent else b""
+    if unsent:
+        unsent.clear()
+    in_flight = b""  # Отдан gRPC; запись подтверждается возвратом в генератор
+    data = memoryview(b"")  # Принят из очереди, но ещё не в кольце
+    try:
+        while True:
+            if pending:
+                audio_data, pending = pending, b""
+            else:
+                audio_data = await audio_queue.get()
+            if audio_data is None:
+                if ring is not None and (rest := ring.flush()) is not None:
+                    in_flight = bytes(rest)
+                    yield recognition_pb2.RecognitionRequest(audio_chunk=in_flight)
+                    in_flight = b""
+                logger.debug("Audio queue closed, finishing request stream.")
+                return
+            if ring is None:
+                in_flight = audio_data
+                yield recognition_pb2.RecognitionRequest(audio_chunk=in_flight)
+                in_flight = b""
+                continue
+            if len(audio_data) >= STT_CHUNK_BYTES:
+                in_flight = ring.drain() + audio_data if len(ring) else audio_data
+                yield recognition_pb2.RecognitionRequest(audio_chunk=in_flight)
+                in_flight = b""
+                continue
+            data = memoryview(audio_data)
+            while data:
+                data = data[ring.write(data) :]
+                for frame in ring.frames():
+                    # protobuf принимает только bytes, кадр копируется в сообщение здесь
+                    in_flight = bytes(frame)
+                    yield recognition_pb2.RecognitionRequest(audio_chunk=in_flight)
+                    in_flight = b""
+    finally:
+        if unsent is not None:
+            rest = ring.drain() if ring is not None else b""
+            unsent.extend(in_flight + rest + bytes(data))
+
+
+class RequestStream:
+    """
+    Поток запросов одного вызова Recognize, который можно остановить.
+
+    gRPC читает запросы в собственной задаче. Если вызов уже закрыт сервером,
+    его cancel() эту задачу не трогает, и она осталась бы ждать очередь аудио
+    (а в долгом потоке — забрала бы из общей очереди чанк следующего потока).
+    aclose() отменяет задачу, если она ждёт аудио, и закрывает генератор.
+    """
 
-    stub = recognition_pb2_grpc.SmartSpeechStub(channel)
+    def __init__(self, requests: AsyncGenerator):
+        self._requests = requests
+        self._reader: asyncio.Task | None = None
+
+    def __aiter__(self) -> "RequestStream":
+        return self
+
+    async def __anext__(self) -> recognition_pb2.RecognitionRequest:
+        self._reader = asyncio.current_task()
+        return await self._requests.__anext__()
+
+    async def aclose(self) -> None:
+        if self._requests.ag_running and self._reader is not None:
+            self._reader.cancel()  # Ждёт очередь внутри генератора
+            await asyncio.wait([self._reader])
+        await self._requests.aclose()
+
+
+async def recognize(
+    audio_queue: asyncio.Queue,
+    multi_utterance: bool = False,
+    encoding: str = ENCODING_PCM,
+    unsent: bytearray | None = None,
+) -> AsyncGenerator[recognition_pb2.Transcription, None]:
+    """
+    Потоковое распознавание речи внутри event loop.
+
+    Параметры:
+    - audio_queue (asyncio.Queue): очередь с фрагментами аудио (None завершает поток).
+    - multi_utterance (bool): не закрывать поток после первой фразы.
+    - encoding (str): кодировка аудио из ENCODINGS_MAP; сжатое передаётся как есть.
+    - unsent (bytearray): аудио, не ушедшее в прошлый поток (см.
+      generate_audio_requests); отправляется первым и пополняется при обрыве.
+
+    Возвращает:
+    - асинхронный генератор транскрипций по мере их поступления от SmartSpeech.
+    """
+    args = build_arguments(multi_utterance, encoding)
+
+    # Канал берётся из общего пула, токен передаётся в самом вызове
+    token_cred = grpc.access_token_call_credentials(args.token)
+    stub = recognition_pb2_grpc.SmartSpeechStub(channel_pool.get())
 
     metadata_pairs = [
         (args.metadata[i], args.metadata[i + 1])
         for i in range(0, len(args.metadata), 2)
     ]
 
+    requests = RequestStream(
+        generate_audio_requests(
+            args.recognition_options,
+            audio_queue,
+            reframe=encoding == ENCODING_PCM,
+            unsent=unsent,
+        )
+    )
     con = stub.Recognize(
-        itertools.chain(
-            (recognition_pb2.RecognitionRequest(options=args.recognition_options),),
-            generate_audio_chunks_from_redis(),
-        ),
+        requests,
         metadata=metadata_pairs,
+        credentials=token_cred,
     )
 
     try:
         logger.info("Starting recognition...")
-        for resp in con:
+        async for resp in con:
             if resp.HasField("transcription"):
                 transcription = resp.transcription
-                normalized_text = transcription.results[0].normalized_text
                 logger.info(
-                    f"Transcription (eou={transcription.eou}): {normalized_text}"
+                    f"Transcription (eou={transcription.eou}): "
+                    f"{transcription.results[0].normalized_text}"
                 )
-                # Сохраняем результат в Redis для отправки клиенту
-                r.lpush("transcriptions", normalized_text if normalized_text else "")
+                yield transcription
             else:
                 logger.warning(f"Non-transcription response: {resp}")
 
@@ -174,6 +291,35 @@ def recognize() -> None:
     except Exception as e:
         logger.error(f"Error: {str(e)}")
     finally:
-        channel.close()
+        con.cancel()
+        # Задача, читающая очередь, должна закончиться вместе с вызовом
+        await requests.aclose()
         logger.info("gRPC recognition finished.")
-        r.set("recognition_done", "1")
+
+
+async def recognize_session(
+    audio_queue: asyncio.Queue, transcripts: asyncio.Queue
+) -> None:
+    """
+    Долгий поток распознавания на всю сессию.
+
+    Один поток с multi-utterance отдаёт транскрипции всех фраз подряд, каждая
+    фраза заканчивается eou. Когда сервис закрывает поток (предельная
+    длительность, обрыв), он тут же открывается заново: аудио всё это время
+    копится в той же очереди, а то, что старый поток принял, но не отправил,
+    уходит первым в новый, поэтому для сессии переподключение незаметно.
+    Работает, пока задачу не отменят.
+    """
+    delay = 0.0
+    unsent = bytearray()
+    while True:
+        received = False
+        stream = recognize(audio_queue, multi_utterance=True, unsent=unsent)
+        async for transcription in stream:
+            received = True
+            transcripts.put_nowait(transcription)
+        metrics.incr("stt.reconnects")
+        # Поток, не давший ни одного результата, переоткрываем с нарастающей паузой
+        delay = 0.0 if received else min(RECONNECT_MAX_DELAY, delay * 2 or 0.5)
+        logger.info(f"Recognition stream ended, reconnecting in {delay:.1f}s...")
+        await asyncio.sleep(delay)
@@ -0,0 +1,126 @@
+import os
+from collections import deque
+
+import numpy as np
+
+from app.metrics import metrics
+from app.sber.transcriber.transcriber import SAMPLE_RATE
+
+# Отсекать тишину до распознавателя
+VAD_GATE = os.getenv("VAD_GATE", "0") == "1"
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "16"))
+# Абсолютный порог энергии кадра (dBFS) и запас над оценкой шума
+VAD_ENERGY_DB = float(os.getenv("VAD_ENERGY_DB", "-45"))
+VAD_NOISE_MARGIN_DB = float(os.getenv("VAD_NOISE_MARGIN_DB", "10"))
+# Кадры с большей долей пересечений нуля — шум/шипение, а не голос
+VAD_MAX_ZCR = float(os.getenv("VAD_MAX_ZCR", "0.35"))
+# Сколько голосовых кадров подряд открывают шлюз
+VAD_ONSET_FRAMES = int(os.getenv("VAD_ONSET_FRAMES", "2"))
+# Сколько аудио отдавать до начала речи и после её конца. Post-roll должен
+# быть длиннее EOU_TIMEOUT_MS, иначе распознаватель не услышит паузу
+VAD_PRE_ROLL_MS = int(os.getenv("VAD_PRE_ROLL_MS", "300"))
+VAD_POST_ROLL_MS = int(os.getenv("VAD_POST_ROLL_MS", "500"))
+
+NOISE_ADAPTATION = 0.05  # Скорость подстройки оценки шума на тихих кадрах
+
+
+def frame_features(frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Энергия (dBFS) и доля пересечений нуля для каждого кадра.
+
+    frames — матрица (кадры × сэмплы) PCM16.
+    """
+    samples = frames.astype(np.float32) / 32768.0
+    energy = 10 * np.log10(np.mean(samples * samples, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+    return energy, zcr
+
+
+class VoiceGate:
+    """
+    Шлюз голосовой активности между WebSocket и распознавателем.
+
+    Входящий PCM16 режется на кадры VAD_FRAME_MS, признаки всех кадров чанка
+    считаются векторно. Кадр голосовой, если его энергия выше порога (абсолютного
+    и адаптивного над шумом) и ZCR не слишком большой. Шлюз открывается после
+    VAD_ONSET_FRAMES голосовых кадров подряд — вместе с pre-roll, накопленным
+    до этого, — и закрывается, когда post-roll прошёл без голоса.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.frame_samples = sample_rate * VAD_FRAME_MS // 1000
+        self.pre_roll: deque[bytes] = deque(maxlen=VAD_PRE_ROLL_MS // VAD_FRAME_MS)
+        self.post_roll_frames = VAD_POST_ROLL_MS // VAD_FRAME_MS
+        self.noise_db = VAD_ENERGY_DB - VAD_NOISE_MARGIN_DB
+        self.is_open = False
+        self._voiced_run = 0
+        self._since_voice = 0
+        self._tail = b""  # Неполный кадр с прошлого чанка
+        self.frames_in = 0
+        self.frames_out = 0
+        # Решения по кадрам последнего чанка (их читает и детектор тишины)
+        self.voiced = np.zeros(0, dtype=bool)
+
+    def classify(self, chunk: bytes) -> tuple[bytes, np.ndarray]:
+        """
+        Режет фрагмент PCM16 на кадры и решает, какие из них голосовые.
+
+        Возвращает целые кадры (неполный хвост ждёт следующего чанка) и
+        решения по ним; оценка шума подстраивается на ходу.
+        """
+        data = self._tail + chunk
+        frame_bytes = self.frame_samples * 2
+        count = len(data) // frame_bytes
+        self._tail = data[count * frame_bytes :]
+        data = data[: count * frame_bytes]
+        if count == 0:
+            self.voiced = np.zeros(0, dtype=bool)
+            return data, self.voiced
+
+        frames = np.frombuffer(data, dtype="<i2")
+        energy, zcr = frame_features(frames.reshape(count, self.frame_samples))
+        threshold = max(VAD_ENERGY_DB, self.noise_db + VAD_NOISE_MARGIN_DB)
+        self.voiced = (energy > threshold) & (zcr < VAD_MAX_ZCR)
+        # Оценка шума обновляется по негромким кадрам
+        quiet = energy[~self.voiced]
+        if quiet.size:
+            self.noise_db += NOISE_ADAPTATION * (float(quiet.mean()) - self.noise_db)
+        return data, self.voiced
+
+    def process(self, chunk: bytes) -> bytes:
+        """Принимает фрагмент PCM16, возвращает то, что нужно отдать распознавателю."""
+        data, voiced = self.classify(chunk)
+        count = len(voiced)
+        if count == 0:
+            return b""
+
+        frame_bytes = self.frame_samples * 2
+        out = []
+        for i, is_voiced in enumerate(voiced):
+            frame = data[i * frame_bytes : (i + 1) * frame_bytes]
+            self._voiced_run = self._voiced_run + 1 if is_voiced else 0
+            self._since_voice = 0 if is_voiced else self._since_voice + 1
+            if not self.is_open and self._voiced_run >= VAD_ONSET_FRAMES:
+                self.is_open = True
+                out.extend(self.pre_roll)
+                self.pre_roll.clear()
+            elif self.is_open and self._since_voice > self.post_roll_frames:
+                self.is_open = False
+            if self.is_open:
+                out.append(frame)
+            else:
+                self.pre_roll.append(frame)
+
+        self.frames_in += count
+        self.frames_out += len(out)
+        metrics.incr("vad.frames_in", count)
+        metrics.incr("vad.frames_dropped", count - len(out))
+        return b"".join(out)
+
+    @property
+    def dropped_fraction(self) -> float:
+        """Доля входящего аудио, не отправленная распознавателю."""
+        if not self.frames_in:
+            return 0.0
+        return max(0.0, 1 - self.frames_out / self.frames_in)
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import os
+from functools import partial
+from typing import AsyncIterator
+
+from fastapi import WebSocket
+from loguru import logger
+
+from app.const import PHRASES
+from app.metrics import TurnTimer, metrics
+from app.sber.ai_agent import router
+from app.sber.ai_agent.ai_agent import stream_answer
+from app.sber.synthesizer.parallel import OrderedSynthesis, Segment
+from app.sber.synthesizer.phrases import phrase_bank, replay
+from app.sber.synthesizer.sentences import iter_sentences, split_clauses
+from app.sber.synthesizer.synthesizer import (
+    audio_duration_ms,
+    stream_speech,
+    voice_sample_rate,
+)
+from app.web.session import Session
+from app.web.speculation import Speculation
+
+# Резать длинные предложения на части по запятым перед синтезом
+TTS_SPLIT_CLAUSES = os.getenv("TTS_SPLIT_CLAUSES", "0") == "1"
+# Если за столько миллисекунд у ответа нет ни одного предложения, играем
+# заготовленную фразу-заполнитель («Секунду.»); 0 — не играть
+FILLER_DELAY_MS = int(os.getenv("TTS_FILLER_DELAY_MS", "800"))
+
+# Готовые ответы роутера: интент -> фраза банка (синтезирована заранее)
+LOCAL_ANSWERS = {
+    router.LOUDER: "ok",
+    router.QUIETER: "ok",
+    router.GREETING: "greeting",
+    router.THANKS: "you_are_welcome",
+    router.GOODBYE: "goodbye",
+}
+
+
+async def stream_reply(
+    websocket: WebSocket,
+    session: Session,
+    text: str,
+    speculation: Speculation | None = None,
+    answer: str | None = None,
+) -> str:
+    """
+    Потоковый ответ на реплику пользователя: LLM → предложения → синтез → клиент.
+
+    Каждое законченное предложение сразу уходит в синтез, несколько предложений
+    синтезируются параллельно (в пределах лимита сессии), пока LLM генерирует
+    следующие. Сначала клиенту уходит заголовок audio_start с форматом, затем
+    аудио фреймами — строго по порядку предложений, в конце audio_end.
+    Формат и голос — те, о которых договорились с клиентом при подключении;
+    после аудио каждого сегмента уходит audio_segment_end (для OGG/Opus это
+    конец файла, который клиент декодирует целиком).
+    Если ответ уже запущен заранее (speculation), токены берутся из него;
+    готовый текст (answer) озвучивается без LLM.
+    Если модель молчит дольше FILLER_DELAY_MS, первым сегментом идёт фраза-
+    заполнитель из банка фраз. reply.silence_removed_ms — сколько тишины она
+    закрыла (не больше своей длительности); reply.filler_delay_ms — насколько
+    она задержала ответ, готовый раньше её конца: клиент играет сегменты по
+    порядку, и ответ ждёт, пока заполнитель доиграет.
+
+    Возвращает:
+    - полный текст ответа.
+    """
+    timer = TurnTimer("reply" if answer is None else "routed_reply")
+    synthesize = partial(
+        stream_speech, format=session.tts_format, voice=session.tts_voice
+    )
+    synthesis = OrderedSynthesis(session.tts_limit, synthesize=synthesize)
+    answer_parts: list[str] = []
+
+    async def tokens() -> AsyncIterator[str]:
+        if answer is not None:
+            answer_parts.append(answer)
+            yield answer
+            return
+        if speculation is not None:
+            source = speculation.stream()
+        else:
+            source = stream_answer(text, session.memory)
+        async for token in source:
+            timer.mark("llm_first_token")
+            answer_parts.append(token)
+            yield token
+        timer.mark("llm_done")
+
+    async def produce_segments() -> None:
+        try:
+            async for sentence in iter_sentences(tokens()):
+                timer.mark("first_sentence")
+                segments = split_clauses(sentence) if TTS_SPLIT_CLAUSES else [sentence]
+                for segment in segments:
+                    synthesis.add(segment)
+        finally:
+            synthesis.close()
+
+    filler: Segment | None = None
+    filler_ms = 0.0
+
+    async def play_filler() -> None:
+        nonlocal filler, filler_ms
+        await asyncio.sleep(FILLER_DELAY_MS / 1000)
+        if len(synthesis) or synthesis.closed:
+            return  # Ответ уже пошёл
+        clip = phrase_bank.next_filler(session.tts_format, session.tts_voice)
+        if clip is None:
+            return  # Фраза ещё синтезируется — будет готова к следующему разу
+        filler_text, audio = clip
+        filler_ms = audio_duration_ms(audio, session.tts_format, session.tts_voice)
+        filler = synthesis.add(
+            filler_text, synthesize=lambda _: replay(audio, session.tts_voice)
+        )
+        metrics.incr("reply.fillers")
+
+    producer = asyncio.create_task(produce_segments())
+    filler_task = asyncio.create_task(play_filler()) if FILLER_DELAY_MS else None
+    spoken = []
+    await websocket.send_text(
+        json.dumps(
+            {
+                "type": "audio_start",
+                "format": session.tts_format,
+                "sample_rate": voice_sample_rate(session.tts_voice),
+                "channels": 1,
+            }
+        )
+    )
+    try:
+        async for segment in synthesis.segments():
+            if segment is not filler:
+                spoken.append(segment.text)
+                await websocket.send_text(
+                    json.dumps(
+                        {
+                            "type": "response",
+                            "status": "streaming",
+                            "text": " ".join(spoken),
+                        }
+                    )
+                )
+            async for frame in synthesis.frames(segment):
+                timer.mark("first_tts")
+                await websocket.send_bytes(frame)
+                timer.mark("first_audio_sent")
+                timer.mark("filler_sent" if segment is filler else "first_answer_sent")
+                metrics.incr(f"tts.out_bytes.{session.tts_format}", len(frame))
+            await websocket.send_text(json.dumps({"type": "audio_segment_end"}))
+        await producer
+    finally:
+        producer.cancel()
+        if filler_task is not None:
+            filler_task.cancel()
+        synthesis.cancel()
+
+    reply = "".join(answer_parts)
+    await websocket.send_text(
+        json.dumps({"type": "response", "status": "final", "text": reply})
+    )
+    await websocket.send_text(json.dumps({"type": "audio_end"}))
+    timer.mark("done")
+    if "filler_sent" in timer.marks and "first_answer_sent" in timer.marks:
+        # Кадры заполнителя уходят из памяти сразу, так что gap — сколько
+        # клиент ждал бы ответа в тишине с начала заполнителя
+        gap = timer.marks["first_answer_sent"] - timer.marks["filler_sent"]
+        metrics.observe("reply.silence_removed_ms", min(gap, filler_ms))
+        metrics.observe("reply.filler_delay_ms", max(0.0, filler_ms - gap))
+    timer.report()
+    logger.info("Synthesized audio sent to client.")
+    return reply
+
+
+async def answer_locally(
+    websocket: WebSocket, session: Session, text: str, intent: str
+) -> str:
+    """
+    Ответ на служебную реплику без LLM.
+
+    «Стоп» — пустой ответ (клиент сразу возвращается к записи; прервать
+    звучащий ответ он не может, см. router.STOP), «повтори» — последний
+    ответ ассистента, громкость — команда клиенту и короткое подтверждение,
+    остальное — фраза из банка. Такие реплики не попадают в историю
+    разговора.
+    """
+    if intent in (router.LOUDER, router.QUIETER):
+        step = 1 if intent == router.LOUDER else -1
+        await websocket.send_text(
+            json.dumps({"type": "control", "action": "volume", "step": step})
+        )
+    if intent == router.STOP:
+        answer = ""
+    elif intent == router.REPEAT:
+        answer = session.last_answer or PHRASES["nothing_to_repeat"]
+    else:
+        answer = PHRASES[LOCAL_ANSWERS[intent]]
+    logger.info(f"Routed locally ({intent}): '{text}'")
+    return await stream_reply(websocket, session, text, answer=answer)
@@ -1,125 +1,298 @@
+import asyncio
 import json
 import os
-from multiprocessing import Process
-import redis
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from loguru import logger
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
+from starlette.websockets import WebSocketState
 
-from app.sber.sql.get_tokens_from_db import get_token_from_db
-from app.sber.transcriber.transcriber import recognize
-from app.sber.sql.update_tokens_in_db import update_tokens_if_needed
-from app.sber.ai_agent.ai_agent import initialize_ai_agent, analyze_text
-from app.sber.synthesizer.synthesizer import synthesize_speech
+from app.sber.http_client import close_http_client
+from app.sber.synthesizer.phrases import phrase_bank
+from app.sber.synthesizer.synthesizer import negotiate_output, voice_sample_rate
+from app.sber.transcriber import recognition_pb2
+from app.sber.transcriber.silence import LOCAL_SILENCE_DETECTION, SilenceDetector
+from app.sber.transcriber.vad import VoiceGate
+from app.sber.transcriber.transcriber import (
+    ENCODING_OPUS,
+    ENCODING_PCM,
+    STT_MULTI_UTTERANCE,
+    channel_pool,
+    recognize,
+)
+from app.sber.sql.update_tokens_in_db import (
+    refresh_tokens_forever,
+    update_tokens_if_needed,
+)
+from app.sber.ai_agent.ai_agent import initialize_ai_agent
+from app.sber.ai_agent.llm import close_llm
+from app.sber.ai_agent.router import INTENT_ROUTER, OPEN, route
+from app.metrics import metrics
+from app.web.pipeline import answer_locally, stream_reply
+from app.web.session import (
+    Session,
+    open_session,
+    close_session,
+    redis_pool,
+)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Токены обновляются в фоне, подключения клиентов OAuth не трогают
+    await update_tokens_if_needed()
+    refresher = asyncio.create_task(refresh_tokens_forever())
+    # Банк фраз готовится в фоне, сервер принимает подключения сразу
+    phrases = asyncio.create_task(phrase_bank.warm())
+    yield
+    phrases.cancel()
+    refresher.cancel()
+    await channel_pool.close()
+    await close_llm()
+    await close_http_client()
+    await redis_pool.disconnect()
+
+
+app = FastAPI(lifespan=lifespan)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
-r = redis.StrictRedis(host="redis")
+
+async def collect_transcriptions(session: Session) -> None:
+    """Передаёт транскрипции распознавателя в сессию до конца реплики."""
+    if session.recognizer is not None:
+        stream = session.utterance()
+    else:
+        stream = recognize(session.audio_queue, encoding=session.audio_encoding)
+    try:
+        async for transcription in stream:
+            text = transcription.results[0].normalized_text
+            session.publish_transcription(text)
+            session.speculator.on_transcription(text, transcription.eou)
+            if transcription.eou:
+                # Распознаватель сам решил, что реплика закончилась: не ждём,
+                # пока поток закроется по no_speech_timeout
+                reason = recognition_pb2.EouReason.Name(transcription.eou_reason)
+                session.end_turn(f"eou_{reason.lower()}")
+                break
+    finally:
+        await stream.aclose()
+        session.finish_recognition()
+
+
+def starts_ogg_stream(data: bytes) -> bool:
+    """Первая страница потока OGG: сигнатура OggS и флаг начала потока (BOS)."""
+    return data[:4] == b"OggS" and len(data) > 5 and bool(data[5] & 0x02)
+
+
+async def upload_audio(websocket: WebSocket, session: Session) -> None:
+    """
+    Пересылает аудио из WebSocket в распознаватель, пока его не остановят.
+
+    С VAD_GATE в распознаватель уходит только речь (с pre-/post-roll).
+    С LOCAL_SILENCE_DETECTION реплика закрывается и по локальной тишине:
+    поток аудио завершается, и распознаватель сразу отдаёт финальный результат.
+    Речь от тишины отличает один VAD: при включённом шлюзе детектор берёт его
+    решения по кадрам, иначе кадры классифицирует отдельный VoiceGate.
+    Оба этапа работают с PCM; Opus от клиента проходит без декодирования.
+    Каждый вызов Recognize ждёт поток OGG с заголовками, поэтому хвост
+    прежнего потока (клиент ещё не получил turn_reset) отбрасывается.
+    """
+    detector = voice = None
+    if LOCAL_SILENCE_DETECTION and session.audio_encoding == ENCODING_PCM:
+        detector = SilenceDetector()
+        voice = session.vad or VoiceGate()
+    awaiting_ogg_start = session.audio_encoding == ENCODING_OPUS
+    while True:
+        audio_data = await websocket.receive_bytes()
+        logger.debug(f"Received audio chunk from WebSocket: {len(audio_data)} bytes")
+        metrics.incr(f"audio.in_bytes.{session.audio_encoding}", len(audio_data))
+        if awaiting_ogg_start:
+            if not starts_ogg_stream(audio_data):
+                metrics.incr("audio.stale_ogg_chunks")
+                continue
+            awaiting_ogg_start = False
+        if session.vad is None:
+            session.audio_queue.put_nowait(audio_data)
+            if voice is not None:
+                voice.classify(audio_data)
+        elif speech := session.vad.process(audio_data):
+            session.audio_queue.put_nowait(speech)
+        if detector and detector.feed(voice.voiced) and session.last_transcription_text:
+            session.end_turn("local_silence")
+            session.stop_utterance()
+            return
+
+
+async def deliver_transcriptions(websocket: WebSocket, session: Session) -> None:
+    """Отправляет клиенту промежуточные транскрипции сразу по мере появления."""
+    while True:
+        await session.partial_ready.wait()
+        session.partial_ready.clear()
+        if session.recognition_done.is_set():
+            return  # Финальный результат отправит основной обработчик
+        await websocket.send_text(
+            json.dumps(
+                {
+                    "type": "transcription",
+                    "status": "streaming",
+                    "text": session.last_transcription_text,
+                }
+            )
+        )
+        logger.debug(f"Sent transcription to client: {session.last_transcription_text}")
+
+
+async def listen_client(websocket: WebSocket) -> bool:
+    """
+    Читает сокет, пока клиент слушает ответ.
+
+    Возвращает True, когда клиент доиграл ответ, и False, если он отключился.
+    """
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return False
+        if message.get("text") == "audio_playback_finished":
+            return True
+        if message.get("bytes") is not None:
+            logger.debug("Received audio data during reply, ignoring...")
+        else:
+            logger.warning(f"Received unexpected message: {message}, continuing to wait...")
 
 
 @app.websocket("/ws/recognize/")
 async def websocket_recognize(websocket: WebSocket) -> None:
-    update_tokens_if_needed()
-    r.flushdb()  # noqa - no await
     await websocket.accept()
-    logger.info("WebSocket connection established.")
+    # Клиент, умеющий кодировать Opus/OGG, просит ?audio=opus; остальные шлют PCM
+    requested = websocket.query_params.get("audio")
+    encoding = ENCODING_OPUS if requested == ENCODING_OPUS else ENCODING_PCM
+    session = open_session(encoding)
+    # Формат ответа: ?tts_format=pcm16|opus, ?tts_rate=24000|8000
+    session.tts_format, session.tts_voice = negotiate_output(
+        websocket.query_params.get("tts_format"), websocket.query_params.get("tts_rate")
+    )
+    logger.info(f"WebSocket connection established (session {session.session_id}).")
+    await websocket.send_text(
+        json.dumps(
+            {
+                "type": "session",
+                "session_id": session.session_id,
+                "tts_format": session.tts_format,
+                "sample_rate": voice_sample_rate(session.tts_voice),
+            }
+        )
+    )
 
-    conversation = initialize_ai_agent(get_token_from_db("giga_chat").get("token"))
-    last_transcription_text = None
+    session.memory = initialize_ai_agent()
+    # Клиент с Opus начинает каждую реплику новым потоком OGG, поэтому
+    # долгий поток распознавания используется только для PCM
+    if STT_MULTI_UTTERANCE and session.audio_encoding == ENCODING_PCM:
+        session.start_recognition_stream()
 
     while True:
-        if last_transcription_text == "":
+        if session.last_transcription_text == "":
             break  # Прерываем цикл, если последнее распознавание пустое
 
-        # Запускаем gRPC-обработчик в отдельном процессе
-        recognition_process = Process(target=recognize)
-        recognition_process.start()
-        r.delete("recognition_done")  # noqa - no await
+        # Запускаем gRPC-распознавание в том же event loop
+        session.start_turn()
+        recognition_task = asyncio.create_task(collect_transcriptions(session))
+        # Загрузка аудио и доставка транскрипций идут независимо друг от друга
+        upload_task = asyncio.create_task(upload_audio(websocket, session))
+        delivery_task = asyncio.create_task(deliver_transcriptions(websocket, session))
+        reply_task = listen_task = None
 
         try:
-            while recognition_process.is_alive():
-                audio_data = await websocket.receive_bytes()
-                logger.debug(
-                    f"Received audio chunk from WebSocket: {len(audio_data)} bytes"
-                )
-                r.lpush("audio_chunks", audio_data)  # noqa - no await!
-
-                transcription: bytes = r.rpop("transcriptions")  # noqa - r.rpop returns bytes
-                if transcription or transcription == b"":
-                    last_transcription_text = transcription.decode("utf-8")
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "type": "transcription",
-                                "status": "streaming",
-                                "text": last_transcription_text,
-                            }
-                        )
-                    )
-                    logger.debug(
-                        f"Sent transcription to client: {last_transcription_text}"
-                    )
+            if session.audio_encoding == ENCODING_OPUS:
+                # Новый вызов Recognize — клиент начинает новый поток OGG, даже
+                # если прошлая реплика оборвалась без текста и запись не прерывалась
+                await websocket.send_text(json.dumps({"type": "turn_reset"}))
+            await asyncio.wait(
+                (recognition_task, upload_task, delivery_task),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            # Дожидаемся остановки загрузчика, прежде чем снова читать из сокета
+            upload_task.cancel()
+            (upload_result,) = await asyncio.gather(
+                upload_task, return_exceptions=True
+            )
+            if isinstance(upload_result, Exception):
+                raise upload_result
+            await delivery_task
 
-            if r.get("recognition_done") == b"1" and last_transcription_text:
+            if session.last_transcription_text:
                 await websocket.send_text(
                     json.dumps(
                         {
                             "type": "transcription",
                             "status": "final",
-                            "text": last_transcription_text,
+                            "text": session.last_transcription_text,
                         }
                     )
                 )
                 logger.success(
                     "Recognition process completed, starting text analysis..."
                 )
-                analyzed_text = analyze_text(last_transcription_text, conversation)
-                await websocket.send_text(
-                    json.dumps({"type": "response", "text": analyzed_text})
+                # Сокет слушаем всё время ответа: отключение клиента отменяет
+                # запрос к LLM и синтез, а не ждёт следующей отправки
+                listen_task = asyncio.create_task(listen_client(websocket))
+                text = session.last_transcription_text
+                intent = route(text).intent if INTENT_ROUTER else OPEN
+                if intent != OPEN:
+                    # Служебная реплика: отвечаем сами, без LLM
+                    session.speculator.cancel()
+                    metrics.incr("router.llm_calls_avoided")
+                    reply = answer_locally(websocket, session, text, intent)
+                else:
+                    speculation = session.speculator.take(text)
+                    reply = stream_reply(websocket, session, text, speculation)
+                reply_task = asyncio.create_task(reply)
+                await asyncio.wait(
+                    (reply_task, listen_task), return_when=asyncio.FIRST_COMPLETED
                 )
-                audio_response = synthesize_speech(analyzed_text)
-                await websocket.send_bytes(audio_response)
-                logger.info("Synthesized audio sent to client.")
+                if listen_task.done() and not listen_task.result():
+                    raise WebSocketDisconnect()
+                analyzed_text = await reply_task
+                if analyzed_text:
+                    session.last_answer = analyzed_text
+                await session.log_turn(session.last_transcription_text, analyzed_text)
 
                 # Ожидаем подтверждения от клиента о завершении воспроизведения
                 logger.info("Waiting for client to finish audio playback...")
-                while True:
-                    message = await websocket.receive()
-                    if (
-                        "text" in message
-                        and message["text"] == "audio_playback_finished"
-                    ):
-                        logger.info(
-                            "Client finished audio playback, resuming recognition cycle."
-                        )
-                        break
-                    elif "bytes" in message:
-                        logger.warning(
-                            "Received unexpected audio data during playback wait, ignoring..."
-                        )
-                        continue  # Игнорируем бинарные данные, если они приходят
-                    else:
-                        logger.warning(
-                            f"Received unexpected message: {message}, continuing to wait..."
-                        )
+                if not await listen_task:
+                    raise WebSocketDisconnect()
+                logger.info("Client finished audio playback, resuming recognition cycle.")
 
+        except WebSocketDisconnect:
+            logger.info(f"Client disconnected (session {session.session_id}).")
+            break
         except Exception as e:
             logger.error(f"WebSocket error: {e}")
             break
         finally:
-            if recognition_process.is_alive():
-                recognition_process.terminate()
-                logger.info("Recognition process terminated.")
+            for task in (upload_task, delivery_task, reply_task, listen_task):
+                if task is not None:
+                    task.cancel()
+            session.speculator.cancel()
+            if not recognition_task.done():
+                session.stop_utterance()
+                recognition_task.cancel()
+                logger.info("Recognition task cancelled.")
 
-    await websocket.close()  # noqa - this code is reachable only if an exception occurs
+    close_session(session)
+    if websocket.client_state == WebSocketState.CONNECTED:
+        await websocket.close()
     logger.info("WebSocket connection closed.")
 
 
+@app.get("/metrics")
+async def metrics_snapshot() -> dict:
+    return metrics.snapshot()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def root() -> str:
     return """
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import AsyncIterator
+
+import redis.asyncio as redis
+from loguru import logger
+
+from app.metrics import metrics
+from app.sber.synthesizer.parallel import TTS_PARALLELISM
+from app.sber.synthesizer.synthesizer import DEFAULT_VOICE, STREAM_FORMAT
+from app.sber.transcriber import recognition_pb2
+from app.sber.transcriber.transcriber import ENCODING_PCM, recognize_session
+from app.sber.transcriber.vad import VAD_GATE, VoiceGate
+from app.web.speculation import Speculator
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+SESSION_TTL = 60 * 60  # Сколько секунд хранить историю сессии в Redis
+
+# Один пул соединений на процесс: обработчики WebSocket не блокируют event loop
+redis_pool = redis.BlockingConnectionPool(
+    host=REDIS_HOST, max_connections=REDIS_MAX_CONNECTIONS
+)
+r = redis.Redis(connection_pool=redis_pool)
+
+
+class Session:
+    """
+    Состояние одного голосового диалога.
+
+    Все очереди, флаги и история разговора принадлежат конкретной сессии,
+    поэтому параллельные подключения не видят данные друг друга.
+    """
+
+    def __init__(
+        self, session_id: str | None = None, audio_encoding: str = ENCODING_PCM
+    ):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.created_at = time.time()
+        # Кодировка аудио от клиента: PCM или Opus/OGG, который уходит в STT как есть
+        self.audio_encoding = audio_encoding
+        # Формат и голос синтеза, о которых договорились с клиентом
+        self.tts_format = STREAM_FORMAT
+        self.tts_voice = DEFAULT_VOICE
+        self.memory = None  # Память разговора; клиент GigaChat общий для всех сессий
+        self.last_transcription_text: str | None = None
+        self.last_answer: str | None = None  # Для команды «повтори»
+        self.audio_queue: asyncio.Queue[bytes | None] = asyncio.Queue()
+        # Долгий поток распознавания (режим multi-utterance) и его транскрипции
+        self.recognizer: asyncio.Task | None = None
+        # Шлюз VAD: тишина и фоновый шум не уходят в распознаватель
+        self.vad = VoiceGate() if VAD_GATE and audio_encoding == ENCODING_PCM else None
+        self.transcripts: asyncio.Queue[recognition_pb2.Transcription | None] = (
+            asyncio.Queue()
+        )
+        self.partial_ready = asyncio.Event()
+        self.recognition_done = asyncio.Event()
+        # Когда транскрипция последний раз менялась
+        self.last_change_at = time.perf_counter()
+        self.turn_end_reason: str | None = None
+        # Ограничение на одновременный синтез сегментов ответа в этой сессии
+        self.tts_limit = asyncio.Semaphore(TTS_PARALLELISM)
+        self.speculator: Speculator | None = None
+
+    def key(self, name: str) -> str:
+        """Имя ключа Redis в пространстве имён сессии."""
+        return f"session:{self.session_id}:{name}"
+
+    def start_recognition_stream(self) -> None:
+        """Открывает один поток распознавания на всю сессию."""
+        self.recognizer = asyncio.create_task(
+            recognize_session(self.audio_queue, self.transcripts)
+        )
+
+    async def utterance(self) -> AsyncIterator[recognition_pb2.Transcription]:
+        """Транскрипции текущей фразы из долгого потока (None — фраза прервана)."""
+        while (transcription := await self.transcripts.get()) is not None:
+            yield transcription
+
+    def stop_utterance(self) -> None:
+        """Завершает ввод текущей фразы."""
+        if self.recognizer is None:
+            self.audio_queue.put_nowait(None)  # Поток фразы закроется сам
+        else:
+            self.transcripts.put_nowait(None)  # Долгий поток продолжает работать
+
+    def start_turn(self) -> None:
+        """Сбрасывает очереди и флаг завершения перед новой репликой."""
+        if self.recognizer is None:
+            self.audio_queue = asyncio.Queue()
+        else:
+            # Всё, что пришло из долгого потока во время ответа, к новой реплике
+            # не относится (например, запоздалый eou прерванной фразы)
+            while not self.transcripts.empty():
+                self.transcripts.get_nowait()
+        self.speculator = Speculator(self.memory)
+        self.last_transcription_text = None
+        self.turn_end_reason = None
+        self.partial_ready.clear()
+        self.recognition_done.clear()
+
+    def publish_transcription(self, text: str) -> None:
+        """
+        Запоминает свежую транскрипцию и будит отправителя.
+
+        Если отправитель не успел отправить предыдущий результат, тот просто
+        перезаписывается: клиенту уходит только последний.
+        """
+        if text != self.last_transcription_text:
+            self.last_change_at = time.perf_counter()
+        self.last_transcription_text = text
+        self.partial_ready.set()
+
+    def end_turn(self, reason: str) -> None:
+        """
+        Фиксирует, почему закончилась реплика пользователя.
+
+        turn.end_delay_ms — сколько прошло с последнего изменения транскрипции,
+        т.е. сколько тишины пользователь ждал, прежде чем пошёл ответ.
+        """
+        if self.turn_end_reason is not None:
+            return
+        self.turn_end_reason = reason
+        metrics.incr(f"turn.end.{reason}")
+        metrics.observe(
+            "turn.end_delay_ms", (time.perf_counter() - self.last_change_at) * 1000
+        )
+        logger.info(f"End of turn: {reason}.")
+
+    def finish_recognition(self) -> None:
+        """Отмечает конец распознавания реплики."""
+        self.end_turn("stream_end")
+        self.recognition_done.set()
+        self.partial_ready.set()
+
+    async def log_turn(self, user_text: str, assistant_text: str) -> None:
+        """Сохраняет реплики пользователя и ассистента в Redis за один round trip."""
+        key = self.key("conversation")
+        ts = time.time()
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.rpush(
+                key,
+                json.dumps({"role": "user", "text": user_text, "ts": ts}),
+                json.dumps({"role": "assistant", "text": assistant_text, "ts": ts}),
+            )
+            pipe.expire(key, SESSION_TTL)
+            await pipe.execute()
+
+
+SESSIONS: dict[str, Session] = {}
+
+
+def open_session(audio_encoding: str = ENCODING_PCM) -> Session:
+    """Создаёт новую сессию и регистрирует её в процессе."""
+    session = Session(audio_encoding=audio_encoding)
+    SESSIONS[session.session_id] = session
+    logger.info(
+        f"Session {session.session_id} opened ({len(SESSIONS)} active, "
+        f"audio {audio_encoding})."
+    )
+    return session
+
+
+def close_session(session: Session) -> None:
+    """Удаляет сессию из реестра. История в Redis живёт до истечения TTL."""
+    if session.recognizer is not None:
+        session.audio_queue.put_nowait(None)
+        session.recognizer.cancel()
+    if session.vad is not None:
+        dropped = session.vad.dropped_fraction
+        metrics.observe("vad.dropped_pct", dropped * 100)
+        logger.info(
+            f"Session {session.session_id}: VAD dropped {dropped:.0%} of audio."
+        )
+    SESSIONS.pop(session.session_id, None)
+    logger.info(f"Session {session.session_id} closed ({len(SESSIONS)} active).")
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import re
+import time
+from typing import AsyncIterator
+
+from loguru import logger
+
+from app.metrics import metrics
+from app.sber.ai_agent.ai_agent import TIMEOUT_ANSWER, stream_answer
+from app.sber.ai_agent.memory import BoundedSummaryMemory
+from app.sber.ai_agent.router import INTENT_ROUTER, OPEN, classify
+
+# Запускать LLM заранее, не дожидаясь финальной транскрипции
+LLM_SPECULATION = os.getenv("LLM_SPECULATION", "0") == "1"
+# Сколько частичная транскрипция должна не меняться, чтобы считаться стабильной
+SPECULATION_STABLE_MS = int(os.getenv("LLM_SPECULATION_STABLE_MS", "400"))
+
+
+def normalize(text: str) -> str:
+    """Текст для сравнения гипотез: без регистра, пунктуации и лишних пробелов."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class Speculation:
+    """
+    Ответ LLM, запущенный заранее по ещё не финальному тексту.
+
+    Токены копятся в очереди, пока ответ не понадобится. В память разговора
+    ответ попадает, только если его забрали и дочитали до конца.
+    """
+
+    def __init__(self, text: str, memory: BoundedSummaryMemory):
+        self.text = text
+        self.memory = memory
+        self.started = time.perf_counter()
+        self._tokens: asyncio.Queue[str | None] = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        try:
+            async for token in stream_answer(self.text, self.memory, remember=False):
+                self._tokens.put_nowait(token)
+        finally:
+            self._tokens.put_nowait(None)
+
+    def matches(self, text: str) -> bool:
+        return normalize(text) == normalize(self.text)
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Токены ответа: уже готовые сразу, остальные по мере генерации."""
+        answer = ""
+        try:
+            while (token := await self._tokens.get()) is not None:
+                answer += token
+                yield token
+            await self._task  # Ошибку запроса пробрасываем наверх
+        finally:
+            # Ответ бросили недочитанным (отмена, отключение) — запрос не нужен
+            self._task.cancel()
+        if answer != TIMEOUT_ANSWER:
+            self.memory.save_context({"input": self.text}, {"response": answer})
+
+    def cancel(self) -> None:
+        self._task.cancel()
+
+
+class Speculator:
+    """
+    Спекулятивный старт LLM в пределах одной реплики.
+
+    Как только распознаватель прислал eou или частичная транскрипция не
+    менялась SPECULATION_STABLE_MS, ответ начинает генерироваться по этому
+    тексту. Если финальный текст совпал — ответ уже в пути, если нет —
+    запрос отменяется и ответ строится заново.
+    """
+
+    def __init__(self, memory: BoundedSummaryMemory, enabled: bool = LLM_SPECULATION):
+        self.memory = memory
+        self.enabled = enabled
+        self.current: Speculation | None = None
+        # Отданный ответ: его LLM-запрос отменяется вместе с репликой
+        self.taken: Speculation | None = None
+        self._timer: asyncio.TimerHandle | None = None
+
+    def on_transcription(self, text: str, eou: bool) -> None:
+        if not self.enabled:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        if not text:
+            return
+        if eou:
+            self._start(text)
+        else:
+            self._timer = asyncio.get_running_loop().call_later(
+                SPECULATION_STABLE_MS / 1000, self._start, text
+            )
+
+    def _start(self, text: str) -> None:
+        if INTENT_ROUTER and classify(text).intent != OPEN:
+            return  # Служебную реплику разберёт роутер, LLM не нужна
+        if self.current is not None:
+            if self.current.matches(text):
+                return
+            self.current.cancel()
+            metrics.incr("speculation.restarts")
+        self.current = Speculation(text, self.memory)
+        metrics.incr("speculation.started")
+        logger.debug(f"Speculative LLM start: {text}")
+
+    def take(self, text: str) -> Speculation | None:
+        """
+        Отдаёт запущенный ответ, если он построен по финальному тексту.
+
+        Выигрыш по задержке — сколько ответ успел генерироваться до финала.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        speculation, self.current = self.current, None
+        if speculation is None:
+            return None
+        if not speculation.matches(text):
+            speculation.cancel()
+            metrics.incr("speculation.misses")
+            logger.info(f"Speculation missed: '{speculation.text}' != '{text}'")
+            return None
+        self.taken = speculation
+        saved_ms = (time.perf_counter() - speculation.started) * 1000
+        metrics.incr("speculation.hits")
+        metrics.observe("speculation.saved_ms", saved_ms)
+        hits = metrics.counters["speculation.hits"]
+        rate = hits / (hits + metrics.counters["speculation.misses"])
+        logger.info(f"Speculation hit, saved {saved_ms:.0f}ms (hit rate {rate:.0%}).")
+        return speculation
+
+    def cancel(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        for speculation in (self.current, self.taken):
+            if speculation is not None:
+                speculation.cancel()
+        self.current = self.taken = None
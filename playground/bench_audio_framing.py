@@ -0,0 +1,151 @@
+"""
+Бенчмарк нарезки аудио перед gRPC-стримом.
+
+Сравниваются два способа превратить входящие фрагменты в RecognitionRequest:
+- direct — каждый фрагмент отдельным сообщением (как было раньше);
+- ring — через кольцевой буфер кадрами по STT_CHUNK_MS
+  (generate_audio_requests).
+
+Фрагменты приходят разными профилями: как от ScriptProcessor (8192 байта),
+мелкими кадрами AudioWorklet и кусками случайного размера (выход VAD).
+Каждое сообщение сериализуется, как это сделал бы gRPC. На секунду аудио
+печатается число сообщений, время CPU (прогон без tracemalloc), пиковая
+память и аллокации.
+
+Аллокации считаются по снимкам tracemalloc в момент выдачи сообщения, пока
+генератор стоит на yield: всё, что он выделил под это сообщение (копия
+кадра, склейка, сам RecognitionRequest), ещё живо, а освобождается при
+следующем шаге, поэтому разность двух соседних снимков была бы нулём.
+Блоки файлов нарезки сверх базового снимка (после сообщения с параметрами)
+усредняются по --samples сообщениям и умножаются на сообщения в секунду.
+Копию аудио внутрь сообщения upb держит в своей арене, вне аллокатора
+Python, — это ещё одна аллокация на каждое сообщение, в таблицу не входит.
+
+Запуск:
+    python -m playground.bench_audio_framing --seconds 60
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+
+from loguru import logger
+
+from app.sber.transcriber import recognition_pb2, ring_buffer, transcriber
+from app.sber.transcriber.transcriber import (
+    SAMPLE_RATE,
+    STT_CHUNK_MS,
+    generate_audio_requests,
+)
+
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+PROFILES = ("script_processor", "worklet", "vad")
+
+
+def make_chunks(profile: str, seconds: int) -> list[bytes]:
+    rng = random.Random(0)
+    total = BYTES_PER_SECOND * seconds
+    chunks = []
+    while total > 0:
+        if profile == "script_processor":
+            size = 8192  # 4096 сэмплов
+        elif profile == "worklet":
+            size = 256  # 128 сэмплов
+        else:
+            size = rng.randrange(512, 8192, 2)
+        size = min(size, total)
+        chunks.append(rng.randbytes(size))
+        total -= size
+    return chunks
+
+
+async def direct_requests(options, audio_queue):
+    yield recognition_pb2.RecognitionRequest(options=options)
+    while (audio_data := await audio_queue.get()) is not None:
+        yield recognition_pb2.RecognitionRequest(audio_chunk=audio_data)
+
+
+def fill_queue(chunks: list[bytes]) -> asyncio.Queue:
+    audio_queue: asyncio.Queue = asyncio.Queue()
+    for chunk in chunks:
+        audio_queue.put_nowait(chunk)
+    audio_queue.put_nowait(None)
+    return audio_queue
+
+
+async def run(framing, chunks: list[bytes]) -> dict:
+    audio_queue = fill_queue(chunks)
+    started = time.process_time()
+    messages = -1  # Первое сообщение — параметры
+    sent = 0
+    async for request in framing(recognition_pb2.RecognitionOptions(), audio_queue):
+        sent += len(request.SerializeToString())
+        messages += 1
+    cpu = time.process_time() - started
+    return {"messages": messages, "bytes": sent, "cpu": cpu}
+
+
+def framing_usage(snapshot: tracemalloc.Snapshot, files: set[str]) -> tuple[int, int]:
+    """Живые блоки и байты, выделенные в файлах нарезки."""
+    stats = snapshot.statistics("filename")
+    blocks = sum(s.count for s in stats if s.traceback[0].filename in files)
+    size = sum(s.size for s in stats if s.traceback[0].filename in files)
+    return blocks, size
+
+
+async def measure_allocations(framing, chunks: list[bytes], samples: int) -> dict:
+    """Блоки и байты, выделенные на одно сообщение, и пиковая память."""
+    if framing is generate_audio_requests:
+        files = {transcriber.__file__, ring_buffer.__file__}
+    else:
+        files = {__file__}
+    requests = framing(recognition_pb2.RecognitionOptions(), fill_queue(chunks))
+    tracemalloc.start()
+    await anext(requests)  # Параметры
+    base_blocks, base_size = framing_usage(tracemalloc.take_snapshot(), files)
+    blocks = size = measured = 0
+    async for request in requests:
+        if measured < samples:
+            used_blocks, used_size = framing_usage(tracemalloc.take_snapshot(), files)
+            blocks += used_blocks - base_blocks
+            size += used_size - base_size
+            measured += 1
+        del request
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"blocks": blocks / measured, "size": size / measured, "peak": peak}
+
+
+async def main(args) -> None:
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    print(f"STT_CHUNK_MS={STT_CHUNK_MS}, {args.seconds}s of audio per run")
+    print(
+        f"{'profile':>17} {'framing':>7} {'msgs/s':>7} {'cpu us/s':>9} "
+        f"{'allocs/s':>9} {'alloc KB/s':>11} {'peak, KB':>9} {'wire, KB/s':>11}"
+    )
+    for profile in PROFILES:
+        chunks = make_chunks(profile, args.seconds)
+        framings = (("direct", direct_requests), ("ring", generate_audio_requests))
+        for name, framing in framings:
+            result = await run(framing, chunks)
+            allocations = await measure_allocations(framing, chunks, args.samples)
+            rate = result["messages"] / args.seconds
+            print(
+                f"{profile:>17} {name:>7} {rate:>7.1f} "
+                f"{result['cpu'] / args.seconds * 1e6:>9.0f} "
+                f"{allocations['blocks'] * rate:>9.1f} "
+                f"{allocations['size'] * rate / 1024:>11.1f} "
+                f"{allocations['peak'] / 1024:>9.1f} "
+                f"{result['bytes'] / args.seconds / 1024:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--samples", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
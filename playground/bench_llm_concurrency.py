@@ -0,0 +1,180 @@
+"""
+Проверка конкурентности: медленный ответ GigaChat не должен останавливать
+приём аудио в других сессиях того же воркера.
+
+Одна сессия задаёт вопрос, на который фейковая модель отвечает через
+--llm-delay секунд. В это время фоновые сессии непрерывно шлют аудио, а
+фейковый распознаватель отмечает, когда сервер забрал каждый их чанк.
+Печатается, сколько чанков фоновых сессий принято за время ожидания модели
+и самая длинная пауза в приёме. С флагом --blocking модель имитирует старый
+синхронный вызов (time.sleep) — приём замирает на всё время ответа.
+
+Затем та же сессия отключается посреди ответа модели — запрос к модели
+должен быть отменён.
+
+Запуск (нужен Redis, см. REDIS_HOST):
+    python -m playground.bench_llm_concurrency --background 8 --llm-delay 2
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+
+import uvicorn
+import websockets
+from langchain_core.messages import AIMessageChunk
+from loguru import logger
+
+from app.sber.ai_agent import ai_agent
+from app.sber.synthesizer.phrases import phrase_bank
+from app.web import pipeline, server
+from playground.bench_sessions import CHUNK_SIZE, fake_transcription, free_port
+
+CHUNK_INTERVAL = 0.02
+QUESTION_TAG = b"question"
+
+# Время приёма каждого чанка фоновых сессий на сервере
+ingested: dict[bytes, list[float]] = defaultdict(list)
+
+
+class FakeLLM:
+    """Модель, которая отвечает через delay секунд."""
+
+    def __init__(self, delay: float, blocking: bool):
+        self.delay = delay
+        self.blocking = blocking
+        self.calls = 0
+        self.cancelled = 0
+
+    async def astream(self, prompt):
+        self.calls += 1
+        try:
+            if self.blocking:
+                time.sleep(self.delay)
+            else:
+                await asyncio.sleep(self.delay)
+            yield AIMessageChunk(content="Готово, ответ на ваш вопрос.")
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+
+
+def install_fakes(llm: FakeLLM) -> None:
+    async def recognize(audio_queue, **options):
+        first = await audio_queue.get()
+        if first is None:
+            return
+        tag = first[:8]
+        if tag == QUESTION_TAG:
+            yield fake_transcription("сколько времени", eou=True)
+            return
+        # Фоновая сессия говорит бесконечно: только отмечаем приём аудио
+        while (audio_data := await audio_queue.get()) is not None:
+            ingested[tag].append(time.perf_counter())
+
+    async def noop():
+        pass
+
+    async def stream_speech(text, **options):
+        yield text.encode()
+
+    server.recognize = recognize
+    server.update_tokens_if_needed = noop
+    server.refresh_tokens_forever = noop
+    ai_agent.get_llm = lambda: llm
+    ai_agent.authorize = lambda: None
+    pipeline.stream_speech = stream_speech
+    # Банк фраз синтезирует в SmartSpeech: без прогрева и без заполнителей
+    phrase_bank.warm = noop
+    pipeline.FILLER_DELAY_MS = 0
+
+
+async def background_client(url: str, index: int, stop: asyncio.Event) -> None:
+    tag = f"b{index:07d}".encode()
+    chunk = tag + bytes(CHUNK_SIZE - len(tag))
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.recv()  # session
+        while not stop.is_set():
+            await ws.send(chunk)
+            await asyncio.sleep(CHUNK_INTERVAL)
+
+
+async def ask(url: str, disconnect_after: float | None = None) -> tuple[float, float]:
+    """Задаёт вопрос; возвращает время начала и конца ожидания ответа."""
+    chunk = QUESTION_TAG + bytes(CHUNK_SIZE - len(QUESTION_TAG))
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.recv()  # session
+        await ws.send(chunk)
+        while True:
+            data = json.loads(await ws.recv())
+            if data["type"] == "transcription" and data["status"] == "final":
+                break
+        started = time.perf_counter()
+        if disconnect_after is not None:
+            await asyncio.sleep(disconnect_after)
+            return started, time.perf_counter()
+        while True:
+            message = await ws.recv()
+            if isinstance(message, str) and json.loads(message)["type"] == "audio_end":
+                break
+        finished = time.perf_counter()
+        await ws.send("audio_playback_finished")
+        return started, finished
+
+
+def report_window(started: float, finished: float) -> None:
+    expected = (finished - started) / CHUNK_INTERVAL
+    print(
+        f"LLM wait: {finished - started:.2f}s, ~{expected:.0f} chunks expected per session"
+    )
+    print(f"{'session':>10} {'chunks':>7} {'max gap, ms':>12}")
+    for tag, times in sorted(ingested.items()):
+        window = [t for t in times if started <= t <= finished]
+        points = [started, *window, finished]
+        gap = max(b - a for a, b in zip(points, points[1:]))
+        print(f"{tag.decode():>10} {len(window):>7} {gap * 1000:>12.0f}")
+
+
+async def main(args) -> None:
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    llm = FakeLLM(args.llm_delay, args.blocking)
+    install_fakes(llm)
+    port = free_port()
+    uv = uvicorn.Server(uvicorn.Config(server.app, port=port, log_level="warning"))
+    serve_task = asyncio.create_task(uv.serve())
+    while not uv.started:
+        await asyncio.sleep(0.05)
+    url = f"ws://127.0.0.1:{port}/ws/recognize/"
+
+    stop = asyncio.Event()
+    background = [
+        asyncio.create_task(background_client(url, i, stop))
+        for i in range(args.background)
+    ]
+    await asyncio.sleep(0.5)  # Фоновые сессии разогнались
+
+    print(f"\n== slow LLM reply ({'blocking' if args.blocking else 'async'}) ==")
+    report_window(*await ask(url))
+
+    print("\n== client disconnects while LLM is answering ==")
+    cancelled_before = llm.cancelled
+    await ask(url, disconnect_after=args.llm_delay / 4)
+    await asyncio.sleep(0.2)
+    print(f"LLM calls cancelled: {llm.cancelled - cancelled_before} of 1")
+
+    stop.set()
+    await asyncio.gather(*background)
+    uv.should_exit = True
+    await serve_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--background", type=int, default=8)
+    parser.add_argument("--llm-delay", type=float, default=2.0)
+    parser.add_argument("--blocking", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,115 @@
+"""
+Микробенчмарк задержки event loop при работе с Redis из WebSocket-обработчиков.
+
+Сравниваются три варианта для N одновременных сессий (по умолчанию 50):
+- sync: синхронный redis.StrictRedis внутри async def (как было раньше);
+- async: redis.asyncio с общим пулом, две команды на фрагмент;
+- pipeline: redis.asyncio, push и poll одним round trip.
+
+Лаг меряется пробной задачей, которая засыпает на 5 мс и фиксирует, насколько
+позже она проснулась.
+
+Запуск (нужен Redis):
+    python -m playground.bench_redis_loop_lag --host localhost --sessions 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import redis
+import redis.asyncio as aioredis
+
+PROBE_INTERVAL = 0.005
+CHUNK = bytes(8192)
+
+
+async def probe_lag(stop: asyncio.Event, samples: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+
+async def session_sync(client, index: int, frames: int) -> None:
+    key = f"bench:{index}"
+    for _ in range(frames):
+        client.lpush(f"{key}:audio", CHUNK)
+        client.rpop(f"{key}:transcriptions")
+        await asyncio.sleep(0)
+
+
+async def session_async(client, index: int, frames: int) -> None:
+    key = f"bench:{index}"
+    for _ in range(frames):
+        await client.lpush(f"{key}:audio", CHUNK)
+        await client.rpop(f"{key}:transcriptions")
+
+
+async def session_pipeline(client, index: int, frames: int) -> None:
+    key = f"bench:{index}"
+    for _ in range(frames):
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.lpush(f"{key}:audio", CHUNK)
+            pipe.rpop(f"{key}:transcriptions")
+            await pipe.execute()
+
+
+async def run(mode: str, client, sessions: int, frames: int) -> dict:
+    stop = asyncio.Event()
+    samples: list[float] = []
+    probe = asyncio.create_task(probe_lag(stop, samples))
+    runner = {
+        "sync": session_sync,
+        "async": session_async,
+        "pipeline": session_pipeline,
+    }[mode]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(runner(client, i, frames) for i in range(sessions)))
+    wall = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    samples.sort()
+    return {
+        "wall": wall,
+        "frames_per_s": sessions * frames / wall,
+        "lag_p50_ms": statistics.median(samples) * 1000 if samples else 0.0,
+        "lag_p99_ms": samples[int(len(samples) * 0.99)] * 1000 if samples else 0.0,
+        "lag_max_ms": samples[-1] * 1000 if samples else 0.0,
+    }
+
+
+async def main(args) -> None:
+    sync_client = redis.StrictRedis(host=args.host, port=args.port)
+    pool = aioredis.BlockingConnectionPool(
+        host=args.host, port=args.port, max_connections=args.sessions
+    )
+    async_client = aioredis.Redis(connection_pool=pool)
+
+    print(
+        f"{'mode':>9} {'wall, s':>8} {'frames/s':>9} {'lag p50':>8} {'lag p99':>8} {'lag max':>8}"
+    )
+    for mode in ("sync", "async", "pipeline"):
+        client = sync_client if mode == "sync" else async_client
+        result = await run(mode, client, args.sessions, args.frames)
+        print(
+            f"{mode:>9} {result['wall']:>8.2f} {result['frames_per_s']:>9.0f} "
+            f"{result['lag_p50_ms']:>7.2f}ms {result['lag_p99_ms']:>7.2f}ms "
+            f"{result['lag_max_ms']:>7.2f}ms"
+        )
+        await async_client.delete(*(f"bench:{i}:audio" for i in range(args.sessions)))
+
+    sync_client.close()
+    await pool.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="redis")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--frames", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,138 @@
+"""
+Роутер интентов: сколько реплик обходятся без LLM и насколько быстрее ответ.
+
+Сначала классификатор гоняется по корпусу реплик в цикле — печатается
+время одной классификации и куда ушла каждая реплика. Затем тот же корпус
+проговаривается через сервер (фейковые распознаватель, синтез и модель,
+отвечающая через --llm-delay секунд): для каждой реплики печатается интент и
+время от финальной транскрипции до audio_end, в конце — сколько вызовов LLM
+удалось избежать.
+
+Запуск (нужен Redis, см. REDIS_HOST):
+    python -m playground.bench_router --llm-delay 1
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import uvicorn
+import websockets
+from loguru import logger
+
+from app.metrics import metrics
+from app.sber.ai_agent import router
+from app.web import server
+from playground.bench_llm_concurrency import FakeLLM, install_fakes
+from playground.bench_sessions import CHUNK_SIZE, fake_transcription, free_port
+
+CORPUS = [
+    "Привет!",
+    "Как сбросить пароль в личном кабинете?",
+    "Что ты сказал?",
+    "Погромче, пожалуйста",
+    "Повтори",
+    "Сколько стоит доставка в Казань?",
+    "Стоп",
+    "Расскажи про тарифы для бизнеса",
+    "Спасибо, а сколько стоит доставка?",
+    "Тише",
+    "Спасибо большое!",
+    "До свидания",
+    # Похожи на команды, но это вопросы — должны уйти в LLM
+    "Почему тише стало?",
+    "Расскажи еще раз анекдот",
+    "Сделай громче будильник",
+    "Скажи еще раз адрес",
+]
+
+
+def bench_classifier(iterations: int) -> None:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for text in CORPUS:
+            router.classify(text)
+    per_call = (time.perf_counter() - started) / (iterations * len(CORPUS))
+    print(f"classify: {per_call * 1e6:.1f} us per utterance")
+    for text in CORPUS:
+        result = router.classify(text)
+        print(
+            f"  {text!r:45} -> {result.intent:9} {result.method:8} "
+            f"{result.confidence:.2f}"
+        )
+
+
+def install_router_fakes(llm: FakeLLM) -> None:
+    install_fakes(llm)
+
+    async def recognize(audio_queue, **options):
+        # Текст реплики приходит в первом чанке вместо аудио
+        first = await audio_queue.get()
+        if first is not None:
+            yield fake_transcription(first.rstrip(b"\0").decode(), eou=True)
+
+    server.recognize = recognize
+    server.INTENT_ROUTER = True
+
+
+async def say(ws, text: str) -> float:
+    """Произносит реплику; возвращает время от финальной транскрипции до audio_end."""
+    encoded = text.encode()
+    await ws.send(encoded + bytes(CHUNK_SIZE - len(encoded)))
+    while True:
+        data = json.loads(await ws.recv())
+        if data["type"] == "transcription" and data["status"] == "final":
+            break
+    started = time.perf_counter()
+    while True:
+        message = await ws.recv()
+        if isinstance(message, str) and json.loads(message)["type"] == "audio_end":
+            break
+    elapsed = time.perf_counter() - started
+    await ws.send("audio_playback_finished")
+    return elapsed
+
+
+async def bench_dialogue(llm_delay: float) -> None:
+    llm = FakeLLM(llm_delay, blocking=False)
+    install_router_fakes(llm)
+    port = free_port()
+    uv = uvicorn.Server(uvicorn.Config(server.app, port=port, log_level="warning"))
+    serve_task = asyncio.create_task(uv.serve())
+    while not uv.started:
+        await asyncio.sleep(0.05)
+
+    print(f"\ndialogue, LLM delay {llm_delay}s:")
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/recognize/") as ws:
+        await ws.recv()  # session
+        for text in CORPUS:
+            elapsed = await say(ws, text)
+            intent = router.classify(text).intent
+            print(f"  {text!r:45} {intent:9} {elapsed * 1000:>7.0f} ms")
+
+    avoided = metrics.counters["router.llm_calls_avoided"]
+    print(f"LLM calls: {llm.calls}, avoided: {avoided} of {len(CORPUS)} turns")
+    timings = metrics.snapshot()["timings"]
+    for name in ("routed_reply.done_ms", "reply.done_ms", "router.classify_us"):
+        if name in timings:
+            p50, p95 = timings[name]["p50"], timings[name]["p95"]
+            print(f"  {name:22} p50 {p50:.1f}  p95 {p95:.1f}")
+
+    uv.should_exit = True
+    await serve_task
+
+
+async def main(args) -> None:
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    bench_classifier(args.iterations)
+    await bench_dialogue(args.llm_delay)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--llm-delay", type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,164 @@
+"""
+Нагрузочный стенд: N одновременных WebSocket-сессий против сервера.
+
+Внешние сервисы (SmartSpeech, GigaChat, синтез) заменяются фейками с
+фиксированной задержкой, поэтому меряется только сам сервер: пропускная
+способность по репликам и отсутствие утечек между сессиями.
+Каждый клиент помечает своё аудио тегом, фейковый распознаватель возвращает
+этот тег как текст — любой чужой тег в ответе означает утечку.
+
+Запуск (нужен Redis, см. REDIS_HOST):
+    python -m playground.bench_sessions --sessions 1 2 4 8 16 32
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import time
+
+import uvicorn
+import websockets
+from loguru import logger
+
+from app.sber.synthesizer.phrases import phrase_bank
+from app.sber.transcriber import recognition_pb2
+from app.web import pipeline, server
+
+CHUNK_SIZE = 8192  # 4096 сэмплов PCM16, как шлёт браузер
+
+
+def fake_transcription(text: str, eou: bool = False) -> recognition_pb2.Transcription:
+    return recognition_pb2.Transcription(
+        results=[recognition_pb2.Hypothesis(normalized_text=text)], eou=eou
+    )
+
+
+def install_fakes(chunks_per_turn: int, stt_delay: float) -> None:
+    async def recognize(audio_queue, **options):
+        for i in range(chunks_per_turn):
+            audio_data = await audio_queue.get()
+            if audio_data is None:
+                return
+            await asyncio.sleep(stt_delay)
+            tag = audio_data[:8].decode()
+            yield fake_transcription(tag, eou=i == chunks_per_turn - 1)
+
+    async def stream_answer(text, memory):
+        yield f"echo:{text}"
+
+    async def update_tokens_if_needed():
+        pass
+
+    async def refresh_tokens_forever():
+        pass
+
+    async def stream_speech(text, **options):
+        yield text.encode()
+
+    async def warm():
+        pass
+
+    server.recognize = recognize
+    server.update_tokens_if_needed = update_tokens_if_needed
+    server.refresh_tokens_forever = refresh_tokens_forever
+    server.initialize_ai_agent = lambda: None
+    pipeline.stream_answer = stream_answer
+    pipeline.stream_speech = stream_speech
+    # Банк фраз синтезирует в SmartSpeech: без прогрева и без заполнителей
+    phrase_bank.warm = warm
+    pipeline.FILLER_DELAY_MS = 0
+
+
+async def run_client(url: str, index: int, turns: int) -> dict:
+    tag = f"s{index:07d}"
+    chunk = tag.encode() + bytes(CHUNK_SIZE - len(tag))
+    leaks = 0
+    completed = 0
+
+    async with websockets.connect(url, max_size=None) as ws:
+        hello = json.loads(await ws.recv())
+        assert hello["type"] == "session"
+
+        for _ in range(turns):
+            stop = asyncio.Event()
+
+            async def send_audio():
+                while not stop.is_set():
+                    await ws.send(chunk)
+                    await asyncio.sleep(0.01)
+
+            sender = asyncio.create_task(send_audio())
+            while True:
+                message = await ws.recv()
+                if isinstance(message, bytes):
+                    if message.decode() != f"echo:{tag}":
+                        leaks += 1
+                    continue
+                data = json.loads(message)
+                if data["type"] == "audio_end":
+                    break
+                text = data.get("text", "")
+                if data["type"] == "transcription" and text != tag:
+                    leaks += 1
+                elif data["type"] == "response" and text != f"echo:{tag}":
+                    leaks += 1
+            stop.set()
+            await sender
+            await ws.send("audio_playback_finished")
+            completed += 1
+
+    return {"turns": completed, "leaks": leaks}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def main(args) -> None:
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    install_fakes(args.chunks_per_turn, args.stt_delay)
+    port = free_port()
+    config = uvicorn.Config(
+        server.app, port=port, log_level="warning", ws_max_size=2**24
+    )
+    uv = uvicorn.Server(config)
+    serve_task = asyncio.create_task(uv.serve())
+    while not uv.started:
+        await asyncio.sleep(0.05)
+
+    url = f"ws://127.0.0.1:{port}/ws/recognize/"
+    print(
+        f"{'sessions':>8} {'wall, s':>8} {'turns/s':>8} {'per session':>12} {'leaks':>6}"
+    )
+    baseline = None
+    for n in args.sessions:
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(run_client(url, i, args.turns) for i in range(n))
+        )
+        wall = time.perf_counter() - started
+        turns = sum(r["turns"] for r in results)
+        leaks = sum(r["leaks"] for r in results)
+        rate = turns / wall
+        baseline = baseline or rate / n
+        print(
+            f"{n:>8} {wall:>8.2f} {rate:>8.1f} {rate / n:>12.2f} {leaks:>6}"
+            f"   (x{rate / baseline:.1f} vs 1 session)"
+        )
+
+    uv.should_exit = True
+    await serve_task
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--chunks-per-turn", type=int, default=8)
+    parser.add_argument("--stt-delay", type=float, default=0.02)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""
+Сравнение форматов ответа: сколько байт уходит клиенту и когда у него
+появляется первое, что можно проиграть.
+
+Ответ из нескольких предложений синтезируется через OrderedSynthesis в каждом
+из форматов, которые клиент может выбрать при подключении, и «отправляется»
+через имитацию канала с пропускной способностью --downlink-kbps (мобильный
+интернет по умолчанию). PCM16 можно играть с первого фрейма, OGG/Opus —
+только когда сегмент пришёл целиком (клиент декодирует его decodeAudioData).
+
+По умолчанию синтез имитируется: задержка до первого байта плюс генерация
+быстрее реального времени, размер — по номинальному битрейту формата. С флагом
+--real запросы идут в SmartSpeech (нужен действующий токен salute_speech).
+
+Запуск:
+    python -m playground.bench_tts_formats --downlink-kbps 1000
+"""
+
+import argparse
+import asyncio
+import time
+from functools import partial
+
+from app.sber.synthesizer.parallel import OrderedSynthesis
+from app.sber.synthesizer.sentences import split_segments
+from app.sber.synthesizer.synthesizer import (
+    AUDIO_FRAME_BYTES,
+    frame_bytes_for,
+    stream_speech,
+    voice_for_rate,
+    voice_sample_rate,
+)
+from playground.bench_tts_parallel import long_answer
+
+FORMATS = [("pcm16", 24000), ("pcm16", 8000), ("opus", 24000)]
+SECONDS_PER_CHAR = 0.07  # Около 70 мс речи на символ
+OPUS_BYTES_PER_SECOND = 3000  # Номинальный битрейт 24 кбит/с
+
+
+def fake_synthesizer(first_byte: float, realtime_factor: float):
+    async def synthesize(text, format, voice):
+        await asyncio.sleep(first_byte)
+        seconds = len(text) * SECONDS_PER_CHAR
+        if format == "pcm16":
+            rate, frame_bytes = voice_sample_rate(voice) * 2, frame_bytes_for(voice)
+        else:
+            rate, frame_bytes = OPUS_BYTES_PER_SECOND, AUDIO_FRAME_BYTES
+        total = int(seconds * rate)
+        frames = max(1, total // frame_bytes)
+        for i in range(frames):
+            await asyncio.sleep(seconds * realtime_factor / frames)
+            yield bytes(frame_bytes if i < frames - 1 else total - frame_bytes * i)
+
+    return synthesize
+
+
+async def run(segments, synthesize, format, sample_rate, downlink: float) -> dict:
+    voice = voice_for_rate(sample_rate)
+    synthesis = OrderedSynthesis(
+        asyncio.Semaphore(3), synthesize=partial(synthesize, format=format, voice=voice)
+    )
+    started = time.perf_counter()
+    for segment in segments:
+        synthesis.add(segment)
+    synthesis.close()
+
+    sent = 0
+    first_playable = None
+    async for segment in synthesis.segments():
+        async for frame in synthesis.frames(segment):
+            await asyncio.sleep(len(frame) / downlink)  # Передача по каналу
+            sent += len(frame)
+            if first_playable is None and format == "pcm16":
+                first_playable = time.perf_counter() - started
+        if first_playable is None:
+            first_playable = time.perf_counter() - started  # Сегмент OGG пришёл целиком
+    return {
+        "bytes": sent,
+        "first_playable": first_playable or 0.0,
+        "wall": time.perf_counter() - started,
+    }
+
+
+async def main(args) -> None:
+    synthesize = stream_speech if args.real else fake_synthesizer(args.first_byte, 0.2)
+    segments = split_segments(long_answer(args.paragraphs))
+    downlink = args.downlink_kbps * 1000 / 8
+    print(f"{len(segments)} segments, downlink {args.downlink_kbps} kbit/s")
+    print(f"{'format':>14} {'KB sent':>8} {'first playable, ms':>19} {'wall, s':>8}")
+    for format, sample_rate in FORMATS:
+        result = await run(segments, synthesize, format, sample_rate, downlink)
+        print(
+            f"{format + '@' + str(sample_rate):>14} {result['bytes'] / 1024:>8.1f} "
+            f"{result['first_playable'] * 1000:>19.0f} {result['wall']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=1)
+    parser.add_argument("--downlink-kbps", type=int, default=1000)
+    parser.add_argument("--first-byte", type=float, default=0.15)
+    parser.add_argument("--real", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,99 @@
+"""
+Бенчмарк параллельного синтеза длинных ответов с упорядоченной сборкой.
+
+Длинный многоабзацный ответ делится на сегменты (предложения или части
+предложений) и синтезируется через OrderedSynthesis с разной степенью
+параллелизма. Печатается время до первого фрейма и полное время синтеза.
+
+По умолчанию синтез имитируется: задержка до первого байта плюс время,
+пропорциональное длине текста. С флагом --real запросы идут в SmartSpeech
+(нужен действующий токен salute_speech).
+
+Запуск:
+    python -m playground.bench_tts_parallel --parallelism 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.sber.synthesizer.parallel import OrderedSynthesis
+from app.sber.synthesizer.sentences import split_segments
+from app.sber.synthesizer.synthesizer import stream_speech
+
+PARAGRAPH = (
+    "Спасибо за вопрос, сейчас расскажу подробнее. "
+    "Оформить карту можно в мобильном приложении, на сайте или в любом отделении банка. "
+    "В приложении откройте раздел с картами, выберите подходящий тариф и подтвердите заявку. "
+    "Обычно карта готова через несколько рабочих дней, а цифровая версия доступна сразу. "
+    "Если возникнут сложности, напишите в чат поддержки, и специалист поможет разобраться. "
+)
+
+
+def long_answer(paragraphs: int) -> str:
+    return "\n\n".join(PARAGRAPH.strip() for _ in range(paragraphs))
+
+
+def fake_synthesizer(first_byte: float, per_char: float, frame_bytes: int = 8192):
+    async def synthesize(text):
+        await asyncio.sleep(first_byte)
+        # 24 кГц PCM16 ≈ 48 КБ/с речи, около 70 мс речи на символ
+        total = int(len(text) * 0.07 * 48000)
+        frames = max(1, total // frame_bytes)
+        for _ in range(frames):
+            await asyncio.sleep(len(text) * per_char / frames)
+            yield bytes(frame_bytes)
+
+    return synthesize
+
+
+async def run(segments: list[str], parallelism: int, synthesize) -> dict:
+    synthesis = OrderedSynthesis(asyncio.Semaphore(parallelism), synthesize=synthesize)
+    started = time.perf_counter()
+    for segment in segments:
+        synthesis.add(segment)
+    synthesis.close()
+
+    first_frame = None
+    received = 0
+    async for segment in synthesis.segments():
+        async for frame in synthesis.frames(segment):
+            if first_frame is None:
+                first_frame = time.perf_counter() - started
+            received += len(frame)
+    return {
+        "wall": time.perf_counter() - started,
+        "first_frame": first_frame or 0.0,
+        "bytes": received,
+    }
+
+
+async def main(args) -> None:
+    synthesize = (
+        stream_speech if args.real else fake_synthesizer(args.first_byte, args.per_char)
+    )
+    for clauses in (False, True):
+        segments = split_segments(long_answer(args.paragraphs), clauses=clauses)
+        print(
+            f"\n{len(segments)} segments ({'clauses' if clauses else 'sentences'}), "
+            f"{sum(map(len, segments))} chars"
+        )
+        print(f"{'parallel':>8} {'wall, s':>8} {'first, ms':>10} {'speedup':>8}")
+        baseline = None
+        for parallelism in args.parallelism:
+            result = await run(segments, parallelism, synthesize)
+            baseline = baseline or result["wall"]
+            print(
+                f"{parallelism:>8} {result['wall']:>8.2f} "
+                f"{result['first_frame'] * 1000:>10.0f} {baseline / result['wall']:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parallelism", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--paragraphs", type=int, default=4)
+    parser.add_argument("--first-byte", type=float, default=0.15)
+    parser.add_argument("--per-char", type=float, default=0.002)
+    parser.add_argument("--real", action="store_true")
+    asyncio.run(main(parser.parse_args()))
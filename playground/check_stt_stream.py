@@ -0,0 +1,130 @@
+"""
+Проверка жизненного цикла потока Recognize на локальном фейковом SmartSpeech.
+
+1. Односложный режим: сервер закрывает вызов после первой фразы (eou), как
+   настоящий SmartSpeech. Задача gRPC, читающая аудио из очереди, должна
+   завершиться вместе с вызовом — иначе на каждую реплику остаётся висеть
+   задача, ждущая очередь, которую сессия уже выбросила.
+2. Долгий поток (recognize_session): сервер закрывает поток каждые
+   --close-every чанков. Переподключение должно быть незаметным: до сервера
+   доходят все чанки по порядку, ни один не теряется на стыке потоков.
+
+Аудио — кадры ровно по STT_CHUNK_BYTES, в начале каждого номер чанка.
+
+Запуск:
+    python -m playground.check_stt_stream --turns 10 --chunks 12 --close-every 3
+"""
+
+import argparse
+import asyncio
+import sys
+
+import grpc
+from loguru import logger
+
+from app.sber.transcriber import recognition_pb2, recognition_pb2_grpc, transcriber
+from app.sber.transcriber.transcriber import (
+    STT_CHUNK_BYTES,
+    recognize,
+    recognize_session,
+)
+
+
+def make_chunk(index: int) -> bytes:
+    return index.to_bytes(4, "big") + bytes(STT_CHUNK_BYTES - 4)
+
+
+class FakeSmartSpeech(recognition_pb2_grpc.SmartSpeechServicer):
+    """Отвечает eou на каждый чанк и закрывает вызов после close_after чанков."""
+
+    def __init__(self, close_after: int):
+        self.close_after = close_after
+        self.received: list[int] = []
+
+    async def Recognize(self, request_iterator, context):
+        chunks = 0
+        async for request in request_iterator:
+            if not request.audio_chunk:
+                continue  # Параметры распознавания
+            index = int.from_bytes(request.audio_chunk[:4], "big")
+            self.received.append(index)
+            chunks += 1
+            yield recognition_pb2.RecognitionResponse(
+                transcription=recognition_pb2.Transcription(
+                    results=[recognition_pb2.Hypothesis(normalized_text=str(index))],
+                    eou=True,
+                )
+            )
+            if chunks >= self.close_after:
+                return
+
+
+class LocalChannel:
+    def __init__(self, address: str):
+        credentials = grpc.local_channel_credentials()
+        self.channel = grpc.aio.secure_channel(address, credentials)
+
+    def get(self) -> grpc.aio.Channel:
+        return self.channel
+
+
+async def start_server(servicer: FakeSmartSpeech) -> tuple[grpc.aio.Server, str]:
+    server = grpc.aio.server()
+    recognition_pb2_grpc.add_SmartSpeechServicer_to_server(servicer, server)
+    port = server.add_secure_port("127.0.0.1:0", grpc.local_server_credentials())
+    await server.start()
+    address = f"127.0.0.1:{port}"
+    transcriber.channel_pool = LocalChannel(address)
+    return server, address
+
+
+async def check_single_utterance(turns: int) -> None:
+    servicer = FakeSmartSpeech(close_after=1)
+    server, _ = await start_server(servicer)
+    baseline = len(asyncio.all_tasks())
+    # Очереди держим, иначе зависшие задачи молча собирает сборщик мусора
+    queues: list[asyncio.Queue] = []
+    for turn in range(turns):
+        audio_queue: asyncio.Queue = asyncio.Queue()  # Как Session.start_turn
+        queues.append(audio_queue)
+        audio_queue.put_nowait(make_chunk(turn))
+        # Дочитываем до конца: вызов закрыт сервером, cancel() уже ничего не отменяет
+        async for _ in recognize(audio_queue):
+            pass
+    await asyncio.sleep(0.2)
+    leaked = len(asyncio.all_tasks()) - baseline
+    print(f"single utterance: {turns} turns, {leaked} leaked tasks")
+    await server.stop(None)
+
+
+async def check_reconnects(chunks: int, close_every: int) -> None:
+    servicer = FakeSmartSpeech(close_after=close_every)
+    server, _ = await start_server(servicer)
+    audio_queue: asyncio.Queue = asyncio.Queue()
+    transcripts: asyncio.Queue = asyncio.Queue()
+    session = asyncio.create_task(recognize_session(audio_queue, transcripts))
+    for index in range(chunks):
+        audio_queue.put_nowait(make_chunk(index))
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.3)
+    session.cancel()
+    await asyncio.gather(session, return_exceptions=True)
+    lost = sorted(set(range(chunks)) - set(servicer.received))
+    print(f"reconnects: sent {chunks}, received {servicer.received}, lost {lost}")
+    await server.stop(None)
+
+
+async def main(args) -> None:
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    transcriber.get_token_from_db = lambda name: {"token": "fake"}
+    await check_single_utterance(args.turns)
+    await check_reconnects(args.chunks, args.close_every)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=12)
+    parser.add_argument("--close-every", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
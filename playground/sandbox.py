@@ -1,4 +1,5 @@
 import argparse
+import asyncio
 import itertools
 import sys
 import time
@@ -179,7 +180,7 @@ class Arguments:
 
 
 def main():
-    update_tokens_if_needed()
+    asyncio.run(update_tokens_if_needed())
     input_device_info = sounddevice.query_devices(kind="input")
     logger.info("Starting...")
     logger.info(f"Input devices: {input_device_info}")